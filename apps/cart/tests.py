@@ -1,3 +1,103 @@
+import uuid
+from datetime import timedelta
+
+from django.core.cache import cache
 from django.test import TestCase
+from django.utils import timezone
+
+from apps.orders.models import DeliverySlot, DeliveryZone, Order
+from apps.orders.slots import AVAILABILITY_KEY
+from apps.orders.tests import make_product
+from apps.users.models import User
+
+from .models import CartItem
+
+
+class CheckoutTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('shopper', 'shopper@example.com', 'secret')
+        self.client.force_login(self.user)
+        self.product = make_product('Mango', price=7, stock=5)
+
+    def fill_cart(self, quantity=2, product=None):
+        self.client.get('/cart/')  # creates the cart
+        for _ in range(quantity):
+            CartItem.objects.create(cart=self.user.cart, product=product or self.product)
+
+    def checkout(self, key=None, **data):
+        data = {
+            'checkout_key': key or str(uuid.uuid4()),
+            'address': 'Main st 1',
+            'latitude': '41.3',
+            'longitude': '69.2',
+            **data,
+        }
+        return self.client.post('/cart/', data, follow=True)
+
+
+class IdempotentCheckoutTests(CheckoutTestCase):
+    def test_replayed_submission_places_one_order(self):
+        self.fill_cart(2)
+        key = str(uuid.uuid4())
+
+        self.checkout(key)
+        response = self.checkout(key)
+
+        self.assertRedirects(response, '/users/my-orders/')
+        self.assertContains(response, 'This order has already been placed.')
+        self.assertEqual(Order.objects.filter(user=self.user).count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 3)
+
+    def test_double_click_before_the_order_exists_places_one_order(self):
+        self.fill_cart(2)
+        key = str(uuid.uuid4())
+
+        first = self.client.post('/cart/', {'checkout_key': key, 'address': 'Main st 1',
+                                            'latitude': '41.3', 'longitude': '69.2'})
+        self.assertRedirects(first, '/orders/create_order/', fetch_redirect_response=False)
+        self.checkout(key)
+
+        self.assertEqual(Order.objects.filter(user=self.user).count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 3)
+
+
+class DeliveryZoneCheckoutTests(CheckoutTestCase):
+    def setUp(self):
+        super().setUp()
+        DeliveryZone.objects.create(name='Center', polygon=[[41.2, 69.1], [41.2, 69.4], [41.4, 69.4], [41.4, 69.1]])
+
+    def test_invalid_coordinates_are_rejected(self):
+        self.fill_cart(1)
+
+        response = self.checkout(latitude='nan', longitude='inf')
+
+        self.assertRedirects(response, '/cart/')
+        self.assertContains(response, "we don&#x27;t deliver to this address")
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(CartItem.objects.filter(cart=self.user.cart).count(), 1)
+
+
+class DeliverySlotCheckoutTests(CheckoutTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.delete(AVAILABILITY_KEY)
+
+    def test_slot_filled_during_checkout_moves_to_the_next_one(self):
+        start = timezone.now() + timedelta(days=1)
+        slot = DeliverySlot.objects.create(starts_at=start, ends_at=start + timedelta(hours=2), capacity=1)
+        later = DeliverySlot.objects.create(
+            starts_at=start + timedelta(hours=2), ends_at=start + timedelta(hours=4), capacity=1,
+        )
+        self.fill_cart(1)
+
+        self.client.post('/cart/', {'checkout_key': str(uuid.uuid4()), 'address': 'Main st 1',
+                                    'latitude': '41.3', 'longitude': '69.2', 'delivery_slot': slot.id})
+        DeliverySlot.objects.filter(id=slot.id).update(booked=1)
+        response = self.client.get('/orders/create_order/', follow=True)
 
-# Create your tests here.
+        self.assertContains(response, 'we moved it to')
+        self.assertEqual(Order.objects.get(user=self.user).delivery_slot, later)
+        later.refresh_from_db()
+        self.assertEqual(later.booked, 1)
@@ -5,5 +5,6 @@ urlpatterns = [
     path('add_product_to_cart/<int:id>/', views.add_product_to_cart, name='add_product_to_cart'),
     path('add/<int:id>/', views.add, name='add'),
     path('substract/<int:id>/', views.substract, name='substract'),
+    path('quote/', views.quote, name='quote'),
     path('', views.cart, name='cart'),
 ]
\ No newline at end of file
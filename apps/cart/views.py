@@ -1,5 +1,5 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from .models import Cart, CartItem
+from .models import CartItem
 from apps.products.models import Product
 from django.http import Http404
 from django.contrib import messages
@@ -8,21 +8,27 @@ from collections import defaultdict
 from django.db.models import Count
 from django.db.models import Count, F, FloatField, ExpressionWrapper
 from django.conf import settings
-from apps.users.models import UserAddress
+from apps.orders import checkout
+from apps.orders.models import CheckoutRequest
+from apps.orders.delivery import quote as delivery_quote
+from apps.orders.zones import is_deliverable
+from apps.orders.slots import available_slots, is_available as slot_is_available
+from django.http import JsonResponse
+from apps.products.stock import OutOfStock, reserve_stock
+from django.db import transaction
+import uuid
+
+
+def _checkout_key(value):
+    try:
+        return str(uuid.UUID(str(value)))
+    except ValueError:
+        return None
 
 
 @login_required
 def add_product_to_cart(request, id=None):
-    user = request.user
-    try:
-        cart = Cart.objects.get(user = user)
-    except Cart.DoesNotExist:
-        cart = ''
-
-    if cart:
-        print(cart)
-    else:
-        cart = Cart.objects.create(user = user)
+    cart = request.account.cart
     
     try:
         product = get_object_or_404(Product, id=id)
@@ -37,18 +43,12 @@ def add_product_to_cart(request, id=None):
 @login_required
 def cart(request):
     user = request.user
-    try:
-        cart = Cart.objects.get(user = user)
-    except Cart.DoesNotExist:
-        cart = ''
-
-    if not cart:
-        cart = Cart.objects.create(user = user)
+    cart = request.account.cart
     product_cartitems = defaultdict(list)
-    products = Product.objects.annotate(
+    products = Product.objects.filter(
+        cartitems__cart=cart
+    ).annotate(
     cartitem_count=Count('cartitems'),
-    ).filter(
-        cartitem_count__gt=0
     ).annotate(
         total_price=ExpressionWrapper(
             F('price') * F('cartitem_count'),
@@ -62,37 +62,62 @@ def cart(request):
         total_products += product.cartitem_count
 
     if request.method == 'POST':
+        checkout_key = _checkout_key(request.POST.get('checkout_key')) or str(uuid.uuid4())
+        # A replayed submission (double click, browser retry) must not touch the cart again.
+        if CheckoutRequest.objects.filter(key=checkout_key, user=user, order__isnull=False).exists():
+            messages.info(request, "This order has already been placed.")
+            return redirect('users:my-orders')
+        if checkout.pending_key(request.session) == checkout_key:
+            return redirect('orders:create_order')
+
+        if not is_deliverable(request.POST.get('latitude'), request.POST.get('longitude')):
+            messages.error(request, "Sorry, we don't deliver to this address yet.")
+            return redirect('cart:cart')
+
+        delivery_slot = request.POST.get('delivery_slot') or None
+        if delivery_slot and not slot_is_available(delivery_slot):
+            messages.error(request, "That delivery slot is full, please choose another one.")
+            return redirect('cart:cart')
+
         order_dict = {}
         for product in products:
             order_dict[product.id] = product.cartitem_count
-            CartItem.objects.filter(cart = cart, product = product).delete()
-        request.session['order_dict'] = order_dict
-        request.session['address'] = request.POST.get('address')
-        request.session['latitude'] = request.POST.get('latitude')
-        request.session['longitude'] = request.POST.get('longitude')
+
+        try:
+            with transaction.atomic():
+                reserve_stock(user, order_dict, checkout_key)
+                CartItem.objects.filter(cart = cart).delete()
+        except OutOfStock as error:
+            product = Product.objects.filter(id=error.product_id).first()
+            messages.error(request, f"Not enough stock for {product or 'a product'} in your cart.")
+            return redirect('cart:cart')
+        checkout.save(
+            request.session, checkout_key, order_dict,
+            request.POST.get('address'), request.POST.get('latitude'), request.POST.get('longitude'), delivery_slot,
+        )
         return redirect('orders:create_order')
     
-    try:
-        address = UserAddress.objects.get(user=user)
-    except UserAddress.DoesNotExist:
-        address = None
+    address = request.account.address
 
     return render(request, 'cart.html', {'products': products,
                                          'total': total, 
                                          'total_products': total_products, 
                                          'address': address,
+                                         'delivery_quote': delivery_quote(address.latitude, address.longitude) if address else None,
+                                         'checkout_key': uuid.uuid4(),
+                                         'delivery_slots': available_slots(),
                                          "google_maps_api_key": settings.GOOGLE_MAPS_API_KEY})
 
 @login_required
-def add(request, id=None):
-    user = request.user
-    try:
-        cart = Cart.objects.get(user = user)
-    except Cart.DoesNotExist:
-        cart = ''
+def quote(request):
+    result = delivery_quote(request.GET.get('latitude'), request.GET.get('longitude'))
+    if result is None:
+        return JsonResponse({'error': 'Invalid coordinates'}, status=400)
+    return JsonResponse(result)
 
-    if not cart:
-        cart = Cart.objects.create(user = user)
+@login_required
+def add(request, id=None):
+    cart = request.account.cart
     
     try:
         product = get_object_or_404(Product, id=id)
@@ -106,14 +131,7 @@ def add(request, id=None):
 
 @login_required
 def substract(request, id=None):
-    user = request.user
-    try:
-        cart = Cart.objects.get(user = user)
-    except Cart.DoesNotExist:
-        cart = ''
-
-    if not cart:
-        cart = Cart.objects.create(user = user)
+    cart = request.account.cart
 
     try:
         product = get_object_or_404(Product, id=id)
@@ -1,3 +1,18 @@
 from django.contrib import admin
 
-# Register your models here.
+from .jobs import requeue
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'queue', 'priority', 'status', 'attempts', 'max_attempts', 'run_at', 'updated_at')
+    list_filter = ('status', 'queue', 'name')
+    search_fields = ('name', 'last_error')
+    readonly_fields = ('locked_by', 'locked_at', 'last_error', 'created_at', 'updated_at')
+    actions = ('requeue_jobs',)
+
+    @admin.action(description="Requeue selected dead jobs")
+    def requeue_jobs(self, request, queryset):
+        count = requeue(queryset)
+        self.message_user(request, f"Requeued {count} job(s).")
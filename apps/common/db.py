@@ -0,0 +1,12 @@
+def delete_in_batches(queryset, batch_size=1000):
+    """
+    Delete every row of `queryset` with one short DELETE per `batch_size`
+    primary keys, so a large cleanup never holds long locks. Returns the
+    number of rows deleted.
+    """
+    deleted = 0
+    while True:
+        ids = list(queryset.values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += queryset.model._default_manager.filter(pk__in=ids).delete()[0]
@@ -0,0 +1,76 @@
+import math
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Coordinates are bucketed into a fixed grid of GRID_STEP degrees (about 1.1 km
+# north-south). A cell id is row * GRID_COLUMNS + column, so every grid row
+# covers a contiguous id range and a bounding box becomes a few range scans
+# on one indexed integer column.
+GRID_STEP = 0.01
+GRID_COLUMNS = int(round(360 / GRID_STEP))
+
+# Above this many grid rows the range list stops being cheaper than a plain
+# latitude/longitude filter, so grid pruning is skipped.
+MAX_GRID_ROWS = 64
+
+
+def _grid_row(latitude):
+    return int(math.floor((latitude + 90) / GRID_STEP))
+
+
+def _grid_column(longitude):
+    return int(math.floor((longitude + 180) / GRID_STEP)) % GRID_COLUMNS
+
+
+def grid_cell(latitude, longitude):
+    """Grid cell id for a coordinate, or None if the coordinate is missing or invalid."""
+    try:
+        latitude = float(latitude)
+        longitude = float(longitude)
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None
+    return _grid_row(latitude) * GRID_COLUMNS + _grid_column(longitude)
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """(min_lat, max_lat, min_lng, max_lng) enclosing a circle of radius_km."""
+    lat_delta = math.degrees(radius_km / EARTH_RADIUS_KM)
+    cos_lat = math.cos(math.radians(latitude))
+    if cos_lat < 1e-6:
+        lng_delta = 180
+    else:
+        lng_delta = min(180, math.degrees(radius_km / (EARTH_RADIUS_KM * cos_lat)))
+    return (
+        max(-90, latitude - lat_delta),
+        min(90, latitude + lat_delta),
+        max(-180, longitude - lng_delta),
+        min(180, longitude + lng_delta),
+    )
+
+
+def cell_ranges(min_lat, max_lat, min_lng, max_lng):
+    """
+    Inclusive (low, high) cell id ranges covering the box, one per grid row,
+    or None when the box spans too many rows to be worth pruning.
+    Boxes are clamped to [-180, 180] and do not wrap the antimeridian.
+    """
+    first_row, last_row = _grid_row(min_lat), _grid_row(max_lat)
+    if last_row - first_row + 1 > MAX_GRID_ROWS:
+        return None
+    first_column = _grid_column(min_lng)
+    last_column = _grid_column(max_lng) if max_lng < 180 else GRID_COLUMNS - 1
+    return [
+        (row * GRID_COLUMNS + first_column, row * GRID_COLUMNS + last_column)
+        for row in range(first_row, last_row + 1)
+    ]
@@ -0,0 +1,149 @@
+import logging
+import traceback
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .db import delete_in_batches
+from .models import Job, JobStatus
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE = 'default'
+DEFAULT_MAX_ATTEMPTS = 5
+RETRY_BASE_SECONDS = 10
+MAX_RETRY_SECONDS = 60 * 60
+
+_handlers = {}
+
+
+class UnknownJob(Exception):
+    pass
+
+
+def job(name, queue=DEFAULT_QUEUE, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """
+    Register a handler under `name`. Handlers are called with the job's
+    payload as keyword arguments and must be safe to run more than once:
+    a job is retried after a failure and re-run if its worker dies mid-way.
+
+    Handlers live in each app's tasks.py, which the worker imports on start.
+    """
+    def register(func):
+        _handlers[name] = func
+        func.enqueue = lambda priority=0, run_at=None, **payload: enqueue(
+            name, payload, queue=queue, priority=priority, run_at=run_at, max_attempts=max_attempts,
+        )
+        return func
+    return register
+
+
+def enqueue(name, payload=None, queue=DEFAULT_QUEUE, priority=0, run_at=None, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """
+    Store a job for the workers. Inside a transaction the job is only
+    visible once it commits, and disappears with it on rollback.
+    """
+    return Job.objects.create(
+        name=name,
+        payload=payload or {},
+        queue=queue,
+        priority=priority,
+        run_at=run_at or timezone.now(),
+        max_attempts=max_attempts,
+    )
+
+
+def _ready(queue):
+    return (
+        Job.objects
+        .filter(queue=queue, status=JobStatus.QUEUED, run_at__lte=timezone.now())
+        .order_by('-priority', 'run_at', 'id')
+    )
+
+
+def claim(queue, worker, limit=1):
+    """
+    Mark up to `limit` ready jobs as running for `worker` and return them.
+
+    On databases with SKIP LOCKED (PostgreSQL, MySQL 8) concurrent workers
+    lock disjoint rows. Elsewhere (SQLite) each candidate is taken with a
+    conditional UPDATE, so a job another worker got to first is skipped.
+    """
+    now = timezone.now()
+    claimed = {'status': JobStatus.RUNNING, 'locked_by': worker, 'locked_at': now, 'attempts': F('attempts') + 1}
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            ids = list(_ready(queue).select_for_update(skip_locked=True).values_list('id', flat=True)[:limit])
+            Job.objects.filter(id__in=ids).update(**claimed)
+    else:
+        ids = []
+        for job_id in _ready(queue).values_list('id', flat=True)[:limit * 4]:
+            if Job.objects.filter(id=job_id, status=JobStatus.QUEUED).update(**claimed):
+                ids.append(job_id)
+                if len(ids) == limit:
+                    break
+
+    return list(Job.objects.filter(id__in=ids).order_by('-priority', 'run_at', 'id'))
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), MAX_RETRY_SECONDS))
+
+
+def run(job):
+    """Run a claimed job, then mark it done, schedule a retry or move it to dead."""
+    try:
+        handler = _handlers.get(job.name)
+        if handler is None:
+            raise UnknownJob(f'No handler registered for {job.name!r}')
+        handler(**job.payload)
+    except Exception:
+        logger.exception('Job %s (%s) failed on attempt %s', job.id, job.name, job.attempts)
+        job.last_error = traceback.format_exc()
+        job.locked_by = ''
+        job.locked_at = None
+        if job.attempts >= job.max_attempts:
+            job.status = JobStatus.DEAD
+        else:
+            job.status = JobStatus.QUEUED
+            job.run_at = timezone.now() + retry_delay(job.attempts)
+        job.save(update_fields=['status', 'run_at', 'last_error', 'locked_by', 'locked_at', 'updated_at'])
+        return False
+
+    job.status = JobStatus.DONE
+    job.locked_at = None
+    job.save(update_fields=['status', 'locked_at', 'updated_at'])
+    return True
+
+
+def requeue_stale(timeout):
+    """Put back jobs whose worker has held them longer than `timeout` (crashed or killed)."""
+    return (
+        Job.objects
+        .filter(status=JobStatus.RUNNING, locked_at__lt=timezone.now() - timeout)
+        .update(status=JobStatus.QUEUED, locked_by='', locked_at=None, run_at=timezone.now())
+    )
+
+
+def requeue(queryset):
+    """Give dead jobs another full set of attempts."""
+    return queryset.filter(status=JobStatus.DEAD).update(
+        status=JobStatus.QUEUED, attempts=0, run_at=timezone.now(), locked_by='', locked_at=None,
+    )
+
+
+def purge_finished(older_than, batch_size=1000):
+    """
+    Delete done jobs finished more than `older_than` ago, in short batches
+    on the (status, updated_at) index. Dead jobs are kept for inspection
+    and requeueing from the admin. Returns the number of rows deleted.
+    """
+    finished = (
+        Job.objects
+        .filter(status=JobStatus.DONE, updated_at__lt=timezone.now() - older_than)
+        .order_by('updated_at')
+    )
+    return delete_in_batches(finished, batch_size)
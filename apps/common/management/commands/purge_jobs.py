@@ -0,0 +1,17 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from apps.common import jobs
+
+
+class Command(BaseCommand):
+    help = "Delete finished (done) background jobs in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7, help="Keep jobs finished within this many days.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        deleted = jobs.purge_finished(timedelta(days=options['days']), batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Purged {deleted} finished job(s)."))
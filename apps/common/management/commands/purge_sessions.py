@@ -0,0 +1,17 @@
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.common.db import delete_in_batches
+
+
+class Command(BaseCommand):
+    help = "Delete expired rows from the session table in batches (a batched clearsessions)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        expired = Session.objects.filter(expire_date__lt=timezone.now()).order_by('expire_date')
+        deleted = delete_in_batches(expired, options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Purged {deleted} expired session(s)."))
@@ -0,0 +1,80 @@
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from django.utils.module_loading import autodiscover_modules
+
+from apps.common import jobs
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Process background jobs from the database queue until stopped."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queue', default=jobs.DEFAULT_QUEUE)
+        parser.add_argument('--concurrency', type=int, default=1, help="Worker threads in this process.")
+        parser.add_argument('--poll-interval', type=float, default=1.0, help="Seconds to wait when the queue is empty.")
+        parser.add_argument('--stale-after', type=int, default=600,
+                            help="Seconds after which a running job is assumed lost and requeued.")
+        parser.add_argument('--once', action='store_true', help="Exit once the queue is empty.")
+
+    def handle(self, *args, **options):
+        autodiscover_modules('tasks')
+        self.stopping = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: self.stopping.set())
+        signal.signal(signal.SIGINT, lambda *_: self.stopping.set())
+
+        self.requeue_stale(options)
+        # Workers on other hosts can die at any time, so keep looking for their jobs.
+        check_every = max(options['stale_after'] / 2, options['poll_interval'])
+        next_check = time.monotonic() + check_every
+
+        name = f"{socket.gethostname()}:{os.getpid()}"
+        threads = [
+            threading.Thread(target=self.work, args=(f"{name}:{number}", options), daemon=True)
+            for number in range(options['concurrency'])
+        ]
+        for thread in threads:
+            thread.start()
+        # Joining with a timeout keeps the main thread able to receive signals.
+        while any(thread.is_alive() for thread in threads):
+            for thread in threads:
+                thread.join(0.5)
+            if not self.stopping.is_set() and time.monotonic() >= next_check:
+                try:
+                    self.requeue_stale(options)
+                except Exception:
+                    logger.exception("Requeueing stale jobs failed")
+                next_check = time.monotonic() + check_every
+        connection.close()
+        self.stdout.write(self.style.SUCCESS("Worker stopped."))
+
+    def requeue_stale(self, options):
+        close_old_connections()
+        requeued = jobs.requeue_stale(timedelta(seconds=options['stale_after']))
+        if requeued:
+            self.stdout.write(f"Requeued {requeued} stale job(s).")
+
+    def work(self, worker, options):
+        try:
+            while not self.stopping.is_set():
+                close_old_connections()
+                claimed = jobs.claim(options['queue'], worker)
+                if not claimed:
+                    if options['once']:
+                        return
+                    self.stopping.wait(options['poll_interval'])
+                    continue
+                for job in claimed:
+                    # A job that was claimed is always finished, even after a stop request.
+                    jobs.run(job)
+        finally:
+            connection.close()
@@ -1,4 +1,10 @@
+from functools import reduce
+import operator
+
 from django.db import models
+from django.utils import timezone
+
+from .geo import bounding_box, cell_ranges, grid_cell, haversine_km
 
 
 class BaseModel(models.Model):
@@ -6,4 +12,79 @@ class BaseModel(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
-        abstract = True
\ No newline at end of file
+        abstract = True
+
+
+class GridCellQuerySet(models.QuerySet):
+    def within_bbox(self, min_lat, max_lat, min_lng, max_lng):
+        queryset = self
+        ranges = cell_ranges(min_lat, max_lat, min_lng, max_lng)
+        if ranges:
+            queryset = queryset.filter(
+                reduce(operator.or_, (models.Q(grid_cell__range=cells) for cells in ranges))
+            )
+        return queryset.filter(
+            latitude__range=(min_lat, max_lat),
+            longitude__range=(min_lng, max_lng),
+        )
+
+    def within_radius(self, latitude, longitude, radius_km):
+        """
+        Rows within radius_km of the point, nearest first, as a list.
+        Each row gets a `distance_km` attribute.
+        """
+        candidates = self.within_bbox(*bounding_box(latitude, longitude, radius_km))
+        results = []
+        for obj in candidates:
+            obj.distance_km = haversine_km(latitude, longitude, obj.latitude, obj.longitude)
+            if obj.distance_km <= radius_km:
+                results.append(obj)
+        results.sort(key=operator.attrgetter('distance_km'))
+        return results
+
+
+class GridCellModel(models.Model):
+    """Keeps an indexed grid cell id in sync with the model's latitude/longitude."""
+    grid_cell = models.IntegerField(null=True, blank=True, editable=False, db_index=True)
+
+    objects = GridCellQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        self.grid_cell = grid_cell(self.latitude, self.longitude)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'grid_cell'}
+        super().save(*args, **kwargs)
+
+
+class JobStatus(models.TextChoices):
+    QUEUED = 'queued', 'Queued'
+    RUNNING = 'running', 'Running'
+    DONE = 'done', 'Done'
+    DEAD = 'dead', 'Dead'
+
+
+class Job(BaseModel):
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    queue = models.CharField(max_length=50, default='default')
+    priority = models.SmallIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=JobStatus.choices, default=JobStatus.QUEUED)
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['queue', 'status', '-priority', 'run_at']),
+            models.Index(fields=['status', 'updated_at']),
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.id} ({self.status})'
@@ -0,0 +1,74 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+
+def client_ip(request):
+    if settings.RATELIMIT_TRUST_FORWARDED_FOR:
+        forwarded = request.META.get('HTTP_X_FORWARDED_FOR', '')
+        if forwarded:
+            # The last entry is the one our own proxy appended; earlier ones are client-supplied.
+            return forwarded.split(',')[-1].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def _digest(value):
+    return hashlib.md5(str(value).lower().encode()).hexdigest()
+
+
+def hit(key, limit, period):
+    """
+    Count one request against `key` and return the seconds to wait, or 0 if
+    it is within `limit` per `period` seconds.
+
+    Sliding window: the count in the current fixed window plus the previous
+    window's count weighted by how much of it still overlaps the last
+    `period` seconds. Two cache keys per limit, updated with atomic incr.
+    """
+    now = time.time()
+    window, elapsed = divmod(now, period)
+    current_key = f'ratelimit:{key}:{int(window)}'
+    previous = cache.get(f'ratelimit:{key}:{int(window) - 1}', 0)
+
+    cache.add(current_key, 0, timeout=period * 2)
+    try:
+        current = cache.incr(current_key)
+    except ValueError:
+        cache.set(current_key, 1, timeout=period * 2)
+        current = 1
+
+    if previous * (1 - elapsed / period) + current > limit:
+        return int(period - elapsed) + 1
+    return 0
+
+
+def ratelimit(scope, limit, period, account=None, methods=('POST',)):
+    """
+    Allow at most `limit` requests per `period` seconds per client IP and,
+    when `account(request, *args, **kwargs)` returns a value, per account as
+    well. Requests over either limit get a 429 without reaching the view, so
+    no password is hashed and no email is sent for them.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not settings.RATELIMIT_ENABLED or request.method not in methods:
+                return view(request, *args, **kwargs)
+
+            keys = [f'{scope}:ip:{_digest(client_ip(request))}']
+            identity = account(request, *args, **kwargs) if account else None
+            if identity:
+                keys.append(f'{scope}:account:{_digest(identity)}')
+
+            wait = max(hit(key, limit, period) for key in keys)
+            if wait:
+                response = HttpResponse("Too many attempts. Please try again later.", status=429)
+                response['Retry-After'] = str(wait)
+                return response
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
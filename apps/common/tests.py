@@ -1,3 +1,177 @@
-from django.test import TestCase
+import io
+import random
+from datetime import timedelta
 
-# Create your tests here.
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+
+from apps.users.models import User, UserAddress
+
+from . import jobs
+from .geo import grid_cell, haversine_km
+from .models import Job, JobStatus
+from .ratelimit import ratelimit
+
+calls = []
+
+
+@jobs.job('tests.record')
+def record(value):
+    calls.append(value)
+
+
+@jobs.job('tests.fail', max_attempts=2)
+def fail():
+    raise RuntimeError('boom')
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_claims_by_priority_and_runs(self):
+        record.enqueue(value='low')
+        record.enqueue(priority=5, value='high')
+
+        first, = jobs.claim(jobs.DEFAULT_QUEUE, 'w1')
+        self.assertEqual(first.payload, {'value': 'high'})
+        self.assertEqual(first.attempts, 1)
+        self.assertTrue(jobs.run(first))
+        self.assertEqual(calls, ['high'])
+        self.assertEqual(Job.objects.get(id=first.id).status, JobStatus.DONE)
+
+    def test_claimed_job_is_not_handed_out_twice(self):
+        record.enqueue(value=1)
+        self.assertEqual(len(jobs.claim(jobs.DEFAULT_QUEUE, 'w1', limit=5)), 1)
+        self.assertEqual(jobs.claim(jobs.DEFAULT_QUEUE, 'w2', limit=5), [])
+
+    def test_failures_retry_with_backoff_then_go_dead(self):
+        created = fail.enqueue()
+
+        job, = jobs.claim(jobs.DEFAULT_QUEUE, 'w1')
+        self.assertFalse(jobs.run(job))
+        job.refresh_from_db()
+        self.assertEqual(job.status, JobStatus.QUEUED)
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIn('boom', job.last_error)
+
+        Job.objects.filter(id=created.id).update(run_at=timezone.now())
+        job, = jobs.claim(jobs.DEFAULT_QUEUE, 'w1')
+        jobs.run(job)
+        job.refresh_from_db()
+        self.assertEqual(job.status, JobStatus.DEAD)
+
+        self.assertEqual(jobs.requeue(Job.objects.all()), 1)
+        self.assertEqual(len(jobs.claim(jobs.DEFAULT_QUEUE, 'w1')), 1)
+
+    def test_stale_running_jobs_are_requeued(self):
+        record.enqueue(value=1)
+        job, = jobs.claim(jobs.DEFAULT_QUEUE, 'w1')
+        Job.objects.filter(id=job.id).update(locked_at=timezone.now() - timedelta(hours=1))
+
+        self.assertEqual(jobs.requeue_stale(timedelta(minutes=10)), 1)
+        self.assertEqual(len(jobs.claim(jobs.DEFAULT_QUEUE, 'w2')), 1)
+
+    def test_purge_deletes_only_old_done_jobs_in_batches(self):
+        long_ago = timezone.now() - timedelta(days=30)
+        old_done = [record.enqueue(value=n) for n in range(5)]
+        Job.objects.filter(id__in=[job.id for job in old_done]).update(status=JobStatus.DONE, updated_at=long_ago)
+        recent_done = record.enqueue(value='recent')
+        Job.objects.filter(id=recent_done.id).update(status=JobStatus.DONE)
+        dead = fail.enqueue()
+        Job.objects.filter(id=dead.id).update(status=JobStatus.DEAD, updated_at=long_ago)
+        queued = record.enqueue(value='queued')
+        Job.objects.filter(id=queued.id).update(updated_at=long_ago)
+
+        out = io.StringIO()
+        call_command('purge_jobs', days=7, batch_size=2, stdout=out)
+
+        self.assertIn('Purged 5 finished job(s).', out.getvalue())
+        self.assertQuerySetEqual(Job.objects.order_by('id'), [recent_done, dead, queued])
+
+
+class PurgeSessionsTests(TestCase):
+    def make_session(self, expire_date):
+        session = SessionStore()
+        session['user'] = 'someone'
+        session.create()
+        Session.objects.filter(session_key=session.session_key).update(expire_date=expire_date)
+        return session.session_key
+
+    def test_deletes_only_expired_sessions(self):
+        now = timezone.now()
+        for _ in range(5):
+            self.make_session(now - timedelta(minutes=1))
+        live = {self.make_session(now + timedelta(days=1)) for _ in range(2)}
+
+        out = io.StringIO()
+        call_command('purge_sessions', batch_size=2, stdout=out)
+
+        self.assertIn('Purged 5 expired session(s).', out.getvalue())
+        self.assertEqual(set(Session.objects.values_list('session_key', flat=True)), live)
+
+
+@override_settings(RATELIMIT_ENABLED=True, RATELIMIT_TRUST_FORWARDED_FOR=False)
+class RateLimitTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+
+        @ratelimit('test', limit=2, period=60, account=lambda request: request.POST.get('username'))
+        def view(request):
+            return HttpResponse('ok')
+        self.view = view
+
+    def post(self, username, ip='10.0.0.1'):
+        return self.view(self.factory.post('/', {'username': username}, REMOTE_ADDR=ip))
+
+    def test_limits_per_account_across_ips(self):
+        self.assertEqual(self.post('ali', '10.0.0.1').status_code, 200)
+        self.assertEqual(self.post('ali', '10.0.0.2').status_code, 200)
+        response = self.post('ali', '10.0.0.3')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+    def test_limits_per_ip_across_accounts(self):
+        self.post('a')
+        self.post('b')
+        self.assertEqual(self.post('c').status_code, 429)
+        self.assertEqual(self.post('d', '10.0.0.9').status_code, 200)
+
+    def test_get_requests_are_not_counted(self):
+        for _ in range(5):
+            self.assertEqual(self.view(self.factory.get('/')).status_code, 200)
+
+
+class RadiusLookupTests(TestCase):
+    def setUp(self):
+        rng = random.Random(7)
+        self.addresses = []
+        for number in range(60):
+            user = User.objects.create_user(f'u{number}', f'u{number}@example.com', 'secret')
+            self.addresses.append(UserAddress.objects.create(
+                user=user, address=str(number),
+                latitude=41.3 + rng.uniform(-0.2, 0.2), longitude=69.2 + rng.uniform(-0.2, 0.2),
+            ))
+
+    def test_matches_a_brute_force_scan(self):
+        for radius in (0.5, 3, 12):
+            found = UserAddress.objects.within_radius(41.3, 69.2, radius)
+            expected = sorted(
+                (address for address in self.addresses if haversine_km(41.3, 69.2, address.latitude, address.longitude) <= radius),
+                key=lambda address: haversine_km(41.3, 69.2, address.latitude, address.longitude),
+            )
+            self.assertEqual([address.id for address in found], [address.id for address in expected])
+
+    def test_moving_an_address_updates_its_cell(self):
+        address = self.addresses[0]
+        address.latitude, address.longitude = 10.0, 10.0
+        address.save(update_fields=['latitude', 'longitude'])
+
+        self.assertEqual(UserAddress.objects.get(id=address.id).grid_cell, grid_cell(10.0, 10.0))
+        self.assertEqual(UserAddress.objects.within_radius(10.0, 10.0, 1), [address])
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Order, OrderAddress, OrderItem
+from .models import Order, OrderAddress, OrderItem, DailySales, ArchivedOrder, DeliveryZone, DeliverySlot
+from .slots import refresh_availability
 # Register your models here.
 
 @admin.register(Order)
@@ -11,7 +12,7 @@ class OrderAdmin(admin.ModelAdmin):
 
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
-    list_display = ['id', 'order', 'product', 'quantity']
+    list_display = ['id', 'order', 'product', 'quantity', 'price']
     list_filter = ['order']
     search_fields = ['order', 'product', 'quantity']
 
@@ -19,4 +20,53 @@ class OrderItemAdmin(admin.ModelAdmin):
 class OrderAddressAdmin(admin.ModelAdmin):
     list_display = ['id', 'order', 'address', 'latitude', 'longitude']
     list_filter = ['order']
-    search_fields = ['order', 'order', 'latitude', 'longitude']
\ No newline at end of file
+    search_fields = ['order', 'order', 'latitude', 'longitude']
+
+@admin.register(DailySales)
+class DailySalesAdmin(admin.ModelAdmin):
+    list_display = ['date', 'product', 'catalog', 'quantity', 'revenue', 'order_count']
+    list_filter = ['catalog', 'date']
+    list_select_related = ['product', 'catalog']
+    date_hierarchy = 'date'
+    search_fields = ['product__name']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'status', 'total', 'created_at', 'archived_at']
+    list_filter = ['status']
+    search_fields = ['id', 'user__username']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(DeliveryZone)
+class DeliveryZoneAdmin(admin.ModelAdmin):
+    list_display = ['id', 'name', 'is_active', 'updated_at']
+    list_filter = ['is_active']
+    search_fields = ['name']
+
+
+@admin.register(DeliverySlot)
+class DeliverySlotAdmin(admin.ModelAdmin):
+    list_display = ['id', 'starts_at', 'ends_at', 'capacity', 'booked']
+    date_hierarchy = 'starts_at'
+    readonly_fields = ['booked']
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        refresh_availability()
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        refresh_availability()
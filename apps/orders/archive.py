@@ -0,0 +1,76 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from .models import ArchivedOrder, Order, OrderItem, OrderStatus
+from .rollups import deferred_rebuilds
+
+TERMINAL_STATUSES = [OrderStatus.ACCEPTED, OrderStatus.CANCELED]
+
+
+def _archived_copy(order):
+    address = getattr(order, 'orderaddress', None)
+    items = [
+        {
+            'product_id': item.product_id,
+            'catalog_id': item.product.catalog_id,
+            'name': item.product.name,
+            'price': item.price,
+            'quantity': item.quantity,
+            'total': item.total_price,
+        }
+        for item in order.orderitem.all()
+    ]
+    return ArchivedOrder(
+        id=order.id,
+        user_id=order.user_id,
+        status=order.status,
+        created_at=order.created_at,
+        updated_at=order.updated_at,
+        address=address.address if address else '',
+        latitude=address.latitude if address else None,
+        longitude=address.longitude if address else None,
+        items=items,
+        total=sum(item['total'] for item in items),
+    )
+
+
+def archive_orders(days=None, batch_size=500):
+    """
+    Move terminal orders not touched for `days` days into ArchivedOrder,
+    one batch per transaction. Returns the number of orders archived.
+    """
+    if days is None:
+        days = settings.ORDER_ARCHIVE_AFTER_DAYS
+    cutoff = timezone.now() - timedelta(days=days)
+    candidates = (
+        Order.objects
+        .filter(status__in=TERMINAL_STATUSES, updated_at__lt=cutoff)
+        .select_related('orderaddress')
+        .prefetch_related(Prefetch('orderitem', queryset=OrderItem.objects.select_related('product')))
+        .order_by('id')
+    )
+
+    archived = 0
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            batch = list(candidates.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1].id
+            ids = [order.id for order in batch]
+            ArchivedOrder.objects.bulk_create(
+                [_archived_copy(order) for order in batch],
+                ignore_conflicts=True,
+            )
+            # ignore_conflicts does not report skipped rows; only delete orders
+            # that verifiably have an archived copy.
+            archived_ids = list(ArchivedOrder.objects.filter(id__in=ids).values_list('id', flat=True))
+            with deferred_rebuilds():
+                Order.objects.filter(id__in=archived_ids).delete()
+        archived += len(archived_ids)
+    return archived
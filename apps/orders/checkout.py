@@ -0,0 +1,36 @@
+SESSION_KEY = 'checkout'
+
+
+def save(session, key, order_dict, address, latitude, longitude, slot):
+    """Store a pending checkout as one compact session entry."""
+    session[SESSION_KEY] = {
+        'key': key,
+        'items': [[int(product_id), quantity] for product_id, quantity in order_dict.items()],
+        'address': address,
+        'location': [latitude, longitude],
+        'slot': slot,
+    }
+
+
+def load(session):
+    checkout = session.get(SESSION_KEY)
+    if not checkout:
+        return None
+    latitude, longitude = checkout['location']
+    return {
+        'key': checkout['key'],
+        'order_dict': dict(checkout['items']),
+        'address': checkout['address'] or '',
+        'latitude': latitude,
+        'longitude': longitude,
+        'slot': checkout['slot'],
+    }
+
+
+def pending_key(session):
+    checkout = session.get(SESSION_KEY)
+    return checkout['key'] if checkout else None
+
+
+def clear(session):
+    session.pop(SESSION_KEY, None)
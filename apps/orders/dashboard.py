@@ -0,0 +1,135 @@
+from django.core.cache import cache
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from .models import Order, OrderItem, OrderStatus
+
+RECENT_ORDERS = 10
+
+READY_KEY = 'dashboard:ready'
+RECENT_KEY = 'dashboard:recent'
+REVENUE_TIMEOUT = 2 * 24 * 60 * 60
+
+
+def _status_key(status):
+    return f'dashboard:status:{status}'
+
+
+def _revenue_key(date):
+    return f'dashboard:revenue:{date:%Y%m%d}'
+
+
+def order_total(order):
+    return OrderItem.objects.filter(order=order).aggregate(
+        total=Sum(F('quantity') * F('price'))
+    )['total'] or 0
+
+
+def _recent_entry(order, total):
+    return {
+        'id': order.id,
+        'user': str(order.user),
+        'status': order.status,
+        'created_at': order.created_at,
+        'total': total,
+    }
+
+
+def rebuild():
+    """
+    Cold start only: seed every counter from the database. Afterwards the
+    counters are kept current by order writes and the page never queries.
+    """
+    counts = dict(Order.objects.values_list('status').annotate(count=Count('id')).order_by())
+    for status in OrderStatus.values:
+        cache.set(_status_key(status), counts.get(status, 0), timeout=None)
+
+    today = timezone.localdate()
+    revenue = (
+        OrderItem.objects
+        .filter(order__created_at__date=today)
+        .exclude(order__status=OrderStatus.CANCELED)
+        .aggregate(total=Sum(F('quantity') * F('price')))['total']
+    ) or 0
+    cache.set(_revenue_key(today), revenue, timeout=REVENUE_TIMEOUT)
+
+    recent = Order.objects.select_related('user').order_by('-created_at')[:RECENT_ORDERS]
+    cache.set(RECENT_KEY, [_recent_entry(order, order_total(order)) for order in recent], timeout=None)
+    cache.set(READY_KEY, True, timeout=None)
+
+
+def _incr(key, delta):
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        # Evicted or never seeded; the next read rebuilds from the database.
+        cache.delete(READY_KEY)
+
+
+def _update_recent(order_id, **changes):
+    recent = cache.get(RECENT_KEY)
+    if recent is None:
+        return
+    for entry in recent:
+        if entry['id'] == order_id:
+            entry.update(changes)
+            cache.set(RECENT_KEY, recent, timeout=None)
+            return
+
+
+def record_created(order):
+    _incr(_status_key(order.status), 1)
+
+
+def record_placed(order, total):
+    """Checkout completed: count its revenue and put it at the top of the recent list."""
+    if order.status != OrderStatus.CANCELED:
+        _add_revenue(order, total)
+    recent = cache.get(RECENT_KEY)
+    if recent is not None:
+        cache.set(RECENT_KEY, [_recent_entry(order, total)] + recent[:RECENT_ORDERS - 1], timeout=None)
+
+
+def record_status_change(order, old_status):
+    _incr(_status_key(old_status), -1)
+    _incr(_status_key(order.status), 1)
+    if OrderStatus.CANCELED in (old_status, order.status) and placed_today(order):
+        total = order_total(order)
+        _add_revenue(order, -total if order.status == OrderStatus.CANCELED else total)
+    _update_recent(order.id, status=order.status)
+
+
+def record_deleted(order, total):
+    _incr(_status_key(order.status), -1)
+    if order.status != OrderStatus.CANCELED and placed_today(order):
+        _add_revenue(order, -total)
+    recent = cache.get(RECENT_KEY)
+    if recent is not None and any(entry['id'] == order.id for entry in recent):
+        # Let the next read refill the list rather than show fewer than RECENT_ORDERS.
+        cache.delete(READY_KEY)
+
+
+def placed_today(order):
+    return timezone.localdate(order.created_at) == timezone.localdate()
+
+
+def _add_revenue(order, amount):
+    key = _revenue_key(timezone.localdate(order.created_at))
+    if cache.add(key, amount, timeout=REVENUE_TIMEOUT):
+        return
+    _incr(key, amount)
+
+
+def snapshot():
+    if not cache.get(READY_KEY):
+        rebuild()
+    counts = cache.get_many([_status_key(status) for status in OrderStatus.values])
+    today = timezone.localdate()
+    return {
+        'statuses': [
+            {'status': status, 'label': label, 'count': counts.get(_status_key(status), 0)}
+            for status, label in OrderStatus.choices
+        ],
+        'revenue_today': cache.get(_revenue_key(today), 0),
+        'recent': cache.get(RECENT_KEY, []),
+    }
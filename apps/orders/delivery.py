@@ -0,0 +1,98 @@
+import hashlib
+import json
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+from apps.common.geo import EARTH_RADIUS_KM, grid_cell
+
+# Quotes are cached per ~100 m square; the fee/ETA difference inside one is negligible.
+QUOTE_PRECISION = 3
+
+
+def _settings_version():
+    """Changes whenever depots or pricing change, so stale cached quotes are never served."""
+    config = [
+        settings.DELIVERY_DEPOTS,
+        settings.DELIVERY_BASE_FEE,
+        settings.DELIVERY_FEE_PER_KM,
+        settings.DELIVERY_PREP_MINUTES,
+        settings.DELIVERY_SPEED_KMH,
+    ]
+    return hashlib.md5(json.dumps(config, sort_keys=True).encode()).hexdigest()[:8]
+
+
+def _cache_key(version, latitude, longitude):
+    return f'delivery-quote:{version}:{latitude:.{QUOTE_PRECISION}f}:{longitude:.{QUOTE_PRECISION}f}'
+
+
+def haversine_matrix(points, depots):
+    """Great-circle distances in km, shape (len(points), len(depots))."""
+    points = np.radians(points)
+    depots = np.radians(depots)
+    lat1 = points[:, 0, np.newaxis]
+    lng1 = points[:, 1, np.newaxis]
+    lat2 = depots[np.newaxis, :, 0]
+    lng2 = depots[np.newaxis, :, 1]
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def _compute_quotes(points):
+    depots = settings.DELIVERY_DEPOTS
+    depot_points = np.array([(depot['latitude'], depot['longitude']) for depot in depots], dtype=float)
+
+    distances = haversine_matrix(points, depot_points)
+    nearest = distances.argmin(axis=1)
+    distance_km = distances[np.arange(len(points)), nearest]
+    fees = np.round(settings.DELIVERY_BASE_FEE + settings.DELIVERY_FEE_PER_KM * distance_km, 2)
+    eta_minutes = np.ceil(settings.DELIVERY_PREP_MINUTES + distance_km / settings.DELIVERY_SPEED_KMH * 60)
+
+    return [
+        {
+            'depot': depots[depot]['name'],
+            'distance_km': round(float(distance), 2),
+            'fee': float(fee),
+            'eta_minutes': int(eta),
+        }
+        for depot, distance, fee, eta in zip(nearest, distance_km, fees, eta_minutes)
+    ]
+
+
+def quote_many(coordinates):
+    """
+    Delivery quotes for a batch of (latitude, longitude) pairs, in order.
+    Cached quotes are reused; the misses are computed together in one
+    vectorised pass against every depot. Unusable pairs (missing, NaN,
+    infinite or out of range) get None and never reach numpy.
+    """
+    if not coordinates or not settings.DELIVERY_DEPOTS:
+        return [None] * len(coordinates)
+
+    version = _settings_version()
+    keys = []
+    points = {}
+    for latitude, longitude in coordinates:
+        if grid_cell(latitude, longitude) is None:
+            keys.append(None)
+            continue
+        point = (round(float(latitude), QUOTE_PRECISION), round(float(longitude), QUOTE_PRECISION))
+        key = _cache_key(version, *point)
+        points[key] = point
+        keys.append(key)
+    cached = cache.get_many(points) if points else {}
+
+    missing = sorted((key, point) for key, point in points.items() if key not in cached)
+    if missing:
+        computed = _compute_quotes(np.array([point for _, point in missing], dtype=float))
+        fresh = {key: quote for (key, _), quote in zip(missing, computed)}
+        cache.set_many(fresh, timeout=settings.DELIVERY_QUOTE_CACHE_SECONDS)
+        cached.update(fresh)
+
+    return [cached[key] if key else None for key in keys]
+
+
+def quote(latitude, longitude):
+    """Delivery quote for one point, or None if the coordinates are unusable."""
+    return quote_many([(latitude, longitude)])[0]
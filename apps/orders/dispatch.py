@@ -0,0 +1,104 @@
+import numpy as np
+
+from .models import Order, OrderStatus
+
+RUN_STATUSES = [OrderStatus.COLLECTING, OrderStatus.DELIVERING]
+
+DEFAULT_CELL_KM = 3.0
+DEFAULT_MAX_STOPS = 25
+
+KM_PER_DEGREE_LAT = 110.574
+KM_PER_DEGREE_LNG = 111.320
+
+
+def _project(latitudes, longitudes):
+    """Equirectangular projection to km around the mean latitude; accurate enough at city scale."""
+    cos_lat = np.cos(np.radians(latitudes.mean()))
+    return np.column_stack((longitudes * KM_PER_DEGREE_LNG * cos_lat, latitudes * KM_PER_DEGREE_LAT))
+
+
+def _grid_clusters(points, cell_km):
+    cells = np.floor(points / cell_km).astype(np.int64)
+    _, labels = np.unique(cells, axis=0, return_inverse=True)
+    labels = labels.reshape(-1)
+    order = np.argsort(labels, kind='stable')
+    boundaries = np.flatnonzero(np.diff(labels[order])) + 1
+    return np.split(order, boundaries)
+
+
+def _nearest_neighbour_route(points, start=None):
+    """Visit order for `points` (n x 2, km) plus the route length."""
+    count = len(points)
+    if count == 1:
+        return np.array([0]), 0.0
+
+    if start is None:
+        # Starting at the stop farthest from the centre keeps the route from doubling back.
+        start = int(np.argmax(((points - points.mean(axis=0)) ** 2).sum(axis=1)))
+    visited = np.zeros(count, dtype=bool)
+    route = np.empty(count, dtype=np.int64)
+    current = start
+    length = 0.0
+    for step in range(count):
+        route[step] = current
+        visited[current] = True
+        if step == count - 1:
+            break
+        distances = np.hypot(*(points - points[current]).T)
+        distances[visited] = np.inf
+        following = int(np.argmin(distances))
+        length += distances[following]
+        current = following
+    return route, float(length)
+
+
+def plan_runs(coordinates, cell_km=DEFAULT_CELL_KM, max_stops=DEFAULT_MAX_STOPS):
+    """
+    Group coordinates ((lat, lng) pairs) into courier runs.
+
+    Stops are bucketed into square cells of cell_km and each cell is ordered
+    with a nearest-neighbour heuristic. Cells with more than max_stops stops
+    are cut along that route into several runs. Returns a list of
+    (indexes, distance_km) tuples, where indexes point into `coordinates` in
+    visiting order. Coordinates that are not finite are left out; one NaN
+    would otherwise poison the projection of every stop.
+    """
+    if not len(coordinates):
+        return []
+    coordinates = np.asarray(coordinates, dtype=float).reshape(-1, 2)
+    usable = np.flatnonzero(np.isfinite(coordinates).all(axis=1))
+    if not len(usable):
+        return []
+    points = _project(coordinates[usable, 0], coordinates[usable, 1])
+
+    runs = []
+    for cluster in _grid_clusters(points, cell_km):
+        route, _ = _nearest_neighbour_route(points[cluster])
+        stops = cluster[route]
+        for start in range(0, len(stops), max_stops):
+            run = stops[start:start + max_stops]
+            legs = np.hypot(*np.diff(points[run], axis=0).T)
+            runs.append((usable[run].tolist(), float(legs.sum())))
+    runs.sort(key=lambda run: -len(run[0]))
+    return runs
+
+
+def courier_runs(cell_km=DEFAULT_CELL_KM, max_stops=DEFAULT_MAX_STOPS):
+    """Run sheets for every collecting/delivering order that has a usable address."""
+    orders = list(
+        Order.objects
+        # grid_cell is only set for valid coordinates.
+        .filter(status__in=RUN_STATUSES, orderaddress__grid_cell__isnull=False)
+        .select_related('user', 'orderaddress')
+        .prefetch_related('orderitem__product')
+        .order_by('id')
+    )
+    coordinates = [(order.orderaddress.latitude, order.orderaddress.longitude) for order in orders]
+    return [
+        {
+            'number': number,
+            'orders': [orders[index] for index in indexes],
+            'distance_km': distance_km,
+        }
+        for number, (indexes, distance_km) in enumerate(plan_runs(coordinates, cell_km, max_stops), start=1)
+    ]
@@ -0,0 +1,66 @@
+import asyncio
+import threading
+
+from django.db import transaction
+
+# How many undelivered events a slow subscriber may have queued before newer ones are dropped.
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+class OrderEventBroker:
+    """
+    In-process pub/sub from order writes to the SSE streams of the order's
+    owner. Publishers may run in any thread; each subscriber's queue lives on
+    its own event loop and is fed through call_soon_threadsafe. Only streams
+    served by the same process see an event, so run a single ASGI process
+    (or put a shared broker in front) when scaling out.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def subscribe(self, user_id):
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        subscriber = (asyncio.get_running_loop(), queue)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, user_id, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(user_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[user_id]
+
+    def publish(self, user_id, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(_deliver, queue, event)
+            except RuntimeError:
+                # The subscriber's loop has already closed.
+                pass
+
+
+def _deliver(queue, event):
+    try:
+        queue.put_nowait(event)
+    except asyncio.QueueFull:
+        pass
+
+
+broker = OrderEventBroker()
+
+
+def order_event(order):
+    return {'id': order.id, 'status': order.status, 'label': order.get_status_display()}
+
+
+def publish_order_status(order):
+    """Notify the order's owner once the current transaction commits."""
+    event = order_event(order)
+    transaction.on_commit(lambda: broker.publish(order.user_id, event))
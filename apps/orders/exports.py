@@ -0,0 +1,144 @@
+import csv
+import json
+
+from django.db.models import Prefetch
+from django.utils.dateparse import parse_date
+
+from .models import ArchivedOrder, Order, OrderItem
+
+EXPORT_FORMATS = ('csv', 'jsonl')
+EXPORT_CHUNK_SIZE = 500
+
+CSV_HEADER = [
+    'order_id', 'user_id', 'username', 'email', 'status', 'created_at', 'updated_at',
+    'address', 'latitude', 'longitude',
+    'product_id', 'product', 'price', 'quantity', 'total',
+]
+
+
+class Echo:
+    """File-like object whose write() hands the line back to the csv writer's caller."""
+
+    def write(self, value):
+        return value
+
+
+def parse_export_date(value):
+    """A YYYY-MM-DD filter value as a date, None if empty; ValueError if malformed."""
+    if not value:
+        return None
+    date = parse_date(value)
+    if date is None:
+        raise ValueError(f"Invalid date {value!r}, expected YYYY-MM-DD.")
+    return date
+
+
+def _filter(orders, date_from, date_to, status):
+    if date_from:
+        orders = orders.filter(created_at__date__gte=date_from)
+    if date_to:
+        orders = orders.filter(created_at__date__lte=date_to)
+    if status:
+        orders = orders.filter(status=status)
+    return orders.order_by('id')
+
+
+def export_queryset(date_from=None, date_to=None, status=None):
+    orders = Order.objects.select_related('user', 'orderaddress').prefetch_related(
+        Prefetch('orderitem', queryset=OrderItem.objects.select_related('product').order_by('id'))
+    )
+    return _filter(orders, date_from, date_to, status)
+
+
+def archived_export_queryset(date_from=None, date_to=None, status=None):
+    """Orders archive_orders has moved out of Order; an export must still include them."""
+    return _filter(ArchivedOrder.objects.select_related('user'), date_from, date_to, status)
+
+
+def iter_orders(orders, chunk_size=EXPORT_CHUNK_SIZE):
+    # iterator() with a chunk_size runs the prefetch once per chunk, so only
+    # chunk_size orders and their items are ever held in memory at a time.
+    return orders.iterator(chunk_size=chunk_size)
+
+
+def iter_records(orders, archived=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """(order data, item data) pairs for the archived orders, then the live ones."""
+    if archived is not None:
+        for order in archived.iterator(chunk_size=chunk_size):
+            yield _archived_order_data(order), [_archived_item_data(item) for item in order.items]
+    for order in iter_orders(orders, chunk_size):
+        yield _order_data(order), [_item_data(item) for item in order.orderitem.all()]
+
+
+def _archived_order_data(order):
+    return {
+        'order_id': order.id,
+        'user_id': order.user_id,
+        'username': order.user.username,
+        'email': order.user.email,
+        'status': order.status,
+        'created_at': order.created_at.isoformat(),
+        'updated_at': order.updated_at.isoformat(),
+        'address': order.address,
+        'latitude': order.latitude,
+        'longitude': order.longitude,
+    }
+
+
+def _archived_item_data(item):
+    return {
+        'product_id': item['product_id'],
+        'product': item['name'],
+        'price': item['price'],
+        'quantity': item['quantity'],
+        'total': item['total'],
+    }
+
+
+def _order_data(order):
+    address = getattr(order, 'orderaddress', None)
+    return {
+        'order_id': order.id,
+        'user_id': order.user_id,
+        'username': order.user.username,
+        'email': order.user.email,
+        'status': order.status,
+        'created_at': order.created_at.isoformat(),
+        'updated_at': order.updated_at.isoformat(),
+        'address': address.address if address else '',
+        'latitude': address.latitude if address else None,
+        'longitude': address.longitude if address else None,
+    }
+
+
+def _item_data(item):
+    return {
+        'product_id': item.product_id,
+        'product': item.product.name,
+        'price': item.price,
+        'quantity': item.quantity,
+        'total': item.total_price,
+    }
+
+
+def csv_lines(orders, chunk_size=EXPORT_CHUNK_SIZE, archived=None):
+    """One CSV row per order item; orders without items still get one row."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_HEADER)
+    for data, items in iter_records(orders, archived, chunk_size):
+        for item in items or [{}]:
+            row = {**data, **item}
+            yield writer.writerow([row.get(column, '') for column in CSV_HEADER])
+
+
+def jsonl_lines(orders, chunk_size=EXPORT_CHUNK_SIZE, archived=None):
+    """One JSON object per order with its items nested."""
+    for data, items in iter_records(orders, archived, chunk_size):
+        data['items'] = items
+        yield json.dumps(data, ensure_ascii=False) + '\n'
+
+
+def export_lines(orders, export_format, chunk_size=EXPORT_CHUNK_SIZE, archived=None):
+    if export_format == 'jsonl':
+        return jsonl_lines(orders, chunk_size, archived)
+    return csv_lines(orders, chunk_size, archived)
@@ -0,0 +1,39 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.orders.exports import (
+    EXPORT_CHUNK_SIZE, EXPORT_FORMATS, archived_export_queryset, export_lines, export_queryset, parse_export_date,
+)
+from apps.orders.models import OrderStatus
+
+
+class Command(BaseCommand):
+    help = "Stream orders, archived ones included, with their items and addresses as CSV or JSONL."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv')
+        parser.add_argument('--output', help='File to write to (defaults to stdout).')
+        parser.add_argument('--from', dest='date_from', help='Only orders created on or after this date (YYYY-MM-DD).')
+        parser.add_argument('--to', dest='date_to', help='Only orders created on or before this date (YYYY-MM-DD).')
+        parser.add_argument('--status', choices=OrderStatus.values)
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            date_from = parse_export_date(options['date_from'])
+            date_to = parse_export_date(options['date_to'])
+        except ValueError as error:
+            raise CommandError(error)
+
+        filters = {'date_from': date_from, 'date_to': date_to, 'status': options['status']}
+        lines = export_lines(
+            export_queryset(**filters), options['format'],
+            chunk_size=options['chunk_size'], archived=archived_export_queryset(**filters),
+        )
+
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+                output.writelines(lines)
+        else:
+            sys.stdout.writelines(lines)
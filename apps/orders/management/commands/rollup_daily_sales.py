@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from apps.orders.rollups import update_daily_sales
+
+
+class Command(BaseCommand):
+    help = "Incrementally refresh the DailySales rollup from orders changed since the last run."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Ignore the watermark and rebuild every day that has orders.',
+        )
+
+    def handle(self, *args, **options):
+        days, rows = update_daily_sales(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {days} day(s), {rows} rollup row(s)."))
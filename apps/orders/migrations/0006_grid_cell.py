@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:59
+
+from django.db import migrations, models
+
+from apps.common.geo import grid_cell
+
+
+def fill_grid_cells(apps, schema_editor):
+    OrderAddress = apps.get_model('orders', 'OrderAddress')
+    addresses = list(OrderAddress.objects.only('id', 'latitude', 'longitude'))
+    for address in addresses:
+        address.grid_cell = grid_cell(address.latitude, address.longitude)
+    OrderAddress.objects.bulk_update(addresses, ['grid_cell'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_checkout_request'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderaddress',
+            name='grid_cell',
+            field=models.IntegerField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.RunPython(fill_grid_cells, migrations.RunPython.noop),
+    ]
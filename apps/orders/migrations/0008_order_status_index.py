@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_delivery_zone'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='status',
+            field=models.CharField(choices=[('ordered', 'Ordered'), ('collecting', 'Collecting'), ('delivering', 'Delivering'), ('shipped', 'Shipped'), ('accepted', 'Accepted'), ('canceled', 'Canceled')], db_index=True, default='ordered', max_length=20),
+        ),
+    ]
@@ -1,6 +1,8 @@
+from django.core.exceptions import ValidationError
 from django.db import models
 from apps.users.models import User
-from apps.products.models import Product
+from apps.products.models import Product, Catalog
+from apps.common.models import GridCellModel
 
 class OrderStatus(models.TextChoices):
     ORDERED = 'ordered', 'Ordered'
@@ -10,17 +12,40 @@ class OrderStatus(models.TextChoices):
     ACCEPTED = 'accepted', 'Accepted'
     CANCELED = 'canceled', 'Canceled'
 
+class DeliverySlot(models.Model):
+    starts_at = models.DateTimeField(db_index=True)
+    ends_at = models.DateTimeField()
+    capacity = models.PositiveIntegerField()
+    booked = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['starts_at']
+
+    @property
+    def remaining(self):
+        return max(0, self.capacity - self.booked)
+
+    def __str__(self):
+        return f'{self.starts_at:%Y-%m-%d %H:%M}-{self.ends_at:%H:%M}'
+
 class Order(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     # created_at = models.DateTimeField(auto_now_add=True, default='11-11-2011')
     # updated_at = models.DateTimeField(auto_now=True, default='11-11-2011')
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     status = models.CharField(
         max_length=20,
         choices=OrderStatus.choices,
         default=OrderStatus.ORDERED,
+        db_index=True,
     )
+    delivery_slot = models.ForeignKey(DeliverySlot, on_delete=models.SET_NULL, null=True, blank=True, related_name='orders')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at']),
+        ]
 
     @property
     def items_count(self):
@@ -29,7 +54,7 @@ class Order(models.Model):
     def __str__(self):
         return self.user.username
     
-class OrderAddress(models.Model):
+class OrderAddress(GridCellModel):
     order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name='orderaddress')
     address = models.CharField()
     latitude = models.FloatField()
@@ -42,13 +67,109 @@ class OrderItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='orderitem')
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='orderitem')
     quantity = models.PositiveIntegerField()
+    # Unit price when the order was placed; later product price changes must not rewrite past sales.
+    price = models.IntegerField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Order-history search: product ids matching the query -> their orders.
+            models.Index(fields=['product', 'order']),
+        ]
+
     def __str__(self):
         return f'{self.product} in {self.order}'
     
 
     @property
     def total_price(self):
-        return self.product.price * self.quantity
\ No newline at end of file
+        return self.price * self.quantity
+
+
+class DailySales(models.Model):
+    date = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_sales')
+    catalog = models.ForeignKey(Catalog, on_delete=models.CASCADE, related_name='daily_sales')
+    quantity = models.PositiveIntegerField(default=0)
+    revenue = models.BigIntegerField(default=0)
+    order_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = 'Daily sales'
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'product'], name='unique_daily_sales_product'),
+        ]
+        indexes = [
+            models.Index(fields=['catalog', 'date']),
+        ]
+
+    def __str__(self):
+        return f'{self.product_id} on {self.date}'
+
+
+class RollupWatermark(models.Model):
+    name = models.CharField(max_length=100, unique=True)
+    value = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'{self.name}: {self.value}'
+
+
+class ArchivedOrder(models.Model):
+    """Compact copy of a terminal order; items and address are flattened into this row."""
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_orders')
+    status = models.CharField(max_length=20, choices=OrderStatus.choices)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    address = models.CharField(blank=True, default='')
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    items = models.JSONField(default=list)
+    total = models.BigIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at']),
+        ]
+
+    @property
+    def items_count(self):
+        return len(self.items)
+
+    def __str__(self):
+        return f'Archived order {self.id}'
+
+
+class CheckoutRequest(models.Model):
+    """Idempotency record for a checkout submission; the key is issued with the cart page."""
+    key = models.UUIDField(unique=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='checkout_requests')
+    order = models.OneToOneField(Order, on_delete=models.SET_NULL, null=True, blank=True, related_name='checkout_request')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.key}'
+
+
+class DeliveryZone(models.Model):
+    name = models.CharField(max_length=100, unique=True)
+    # Polygon vertices as [[latitude, longitude], ...]; the ring closes itself.
+    polygon = models.JSONField()
+    is_active = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def clean(self):
+        points = self.polygon if isinstance(self.polygon, list) else []
+        valid = len(points) >= 3 and all(
+            isinstance(point, (list, tuple)) and len(point) == 2
+            and all(isinstance(value, (int, float)) for value in point)
+            for point in points
+        )
+        if not valid:
+            raise ValidationError({'polygon': 'Enter at least three [latitude, longitude] pairs.'})
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,14 @@
+from django.db.models import Count, Sum
+
+from .models import OrderItem, OrderStatus
+
+
+def pick_list(status=OrderStatus.COLLECTING):
+    """Total quantity per product across every order in `status`, grouped by catalog (aisle)."""
+    return (
+        OrderItem.objects
+        .filter(order__status=status)
+        .values('product_id', 'product__name', 'product__catalog__name')
+        .annotate(quantity=Sum('quantity'), orders=Count('order', distinct=True))
+        .order_by('product__catalog__name', 'product__name')
+    )
@@ -0,0 +1,149 @@
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, Max, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from apps.products.models import Product
+from .models import ArchivedOrder, DailySales, Order, OrderItem, OrderStatus, RollupWatermark
+
+DAILY_SALES_WATERMARK = 'daily_sales'
+
+# Orders are re-read slightly behind the watermark so rows committed by a
+# slow transaction with an older updated_at are not skipped. Rebuilding a
+# day is idempotent, so the overlap only costs a little extra work.
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+_deferred = threading.local()
+
+
+def rebuild_daily_sales(dates):
+    """Recompute the DailySales rows for the given dates from live and archived orders."""
+    dates = sorted(set(dates))
+    if not dates:
+        return 0
+
+    rows = (
+        OrderItem.objects
+        .filter(order__created_at__date__in=dates)
+        .exclude(order__status=OrderStatus.CANCELED)
+        .annotate(date=TruncDate('order__created_at'))
+        .values('date', 'product_id', 'product__catalog_id')
+        .annotate(
+            total_quantity=Sum('quantity'),
+            total_revenue=Sum(F('quantity') * F('price')),
+            orders=Count('order', distinct=True),
+        )
+    )
+    totals = {
+        (row['date'], row['product_id']): {
+            'catalog_id': row['product__catalog_id'],
+            'quantity': row['total_quantity'],
+            'revenue': row['total_revenue'],
+            'order_count': row['orders'],
+        }
+        for row in rows
+    }
+    _add_archived_totals(totals, dates)
+
+    existing_products = set(
+        Product.objects.filter(id__in={product_id for _, product_id in totals}).values_list('id', flat=True)
+    )
+    sales = [
+        DailySales(date=date, product_id=product_id, **values)
+        for (date, product_id), values in totals.items()
+        if product_id in existing_products
+    ]
+
+    with transaction.atomic():
+        DailySales.objects.filter(date__in=dates).delete()
+        DailySales.objects.bulk_create(sales, batch_size=500)
+    return len(sales)
+
+
+def _add_archived_totals(totals, dates):
+    archived = (
+        ArchivedOrder.objects
+        .filter(created_at__date__in=dates)
+        .exclude(status=OrderStatus.CANCELED)
+        .only('created_at', 'items')
+    )
+    for order in archived:
+        date = timezone.localdate(order.created_at)
+        seen = set()
+        for item in order.items:
+            key = (date, item['product_id'])
+            values = totals.setdefault(key, {
+                'catalog_id': item['catalog_id'],
+                'quantity': 0,
+                'revenue': 0,
+                'order_count': 0,
+            })
+            values['quantity'] += item['quantity']
+            values['revenue'] += item['total']
+            if key not in seen:
+                values['order_count'] += 1
+                seen.add(key)
+
+
+def update_daily_sales(full=False):
+    """
+    Roll up every day touched by an order changed since the last run.
+    Returns a (days, rows) tuple.
+    """
+    watermark, _ = RollupWatermark.objects.get_or_create(name=DAILY_SALES_WATERMARK)
+
+    orders = Order.objects.all()
+    if watermark.value and not full:
+        orders = orders.filter(updated_at__gt=watermark.value - WATERMARK_OVERLAP)
+
+    latest = orders.aggregate(latest=Max('updated_at'))['latest']
+    if latest is None:
+        return 0, 0
+
+    dates = (
+        orders.filter(updated_at__lte=latest)
+        .annotate(date=TruncDate('created_at'))
+        .values_list('date', flat=True)
+        .distinct()
+    )
+    dates = list(dates)
+    rows = 0
+    # Chunk the days so a full rebuild does not hold one huge transaction.
+    for start in range(0, len(dates), 31):
+        rows += rebuild_daily_sales(dates[start:start + 31])
+
+    if watermark.value is None or latest > watermark.value:
+        watermark.value = latest
+        watermark.save(update_fields=['value'])
+    return len(dates), rows
+
+
+def order_deleted(order):
+    """
+    A deleted order never shows up in the watermark scan, so its day is
+    rebuilt as soon as the delete commits.
+    """
+    if order.status == OrderStatus.CANCELED:
+        return
+    date = timezone.localdate(order.created_at)
+    dates = getattr(_deferred, 'dates', None)
+    if dates is not None:
+        dates.add(date)
+    else:
+        transaction.on_commit(lambda: rebuild_daily_sales([date]))
+
+
+@contextmanager
+def deferred_rebuilds():
+    """Collect the days of orders deleted in the block and rebuild each once, on commit."""
+    dates = _deferred.dates = set()
+    try:
+        yield
+    finally:
+        _deferred.dates = None
+    if dates:
+        transaction.on_commit(lambda: rebuild_daily_sales(dates))
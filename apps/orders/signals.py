@@ -0,0 +1,42 @@
+import copy
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import dashboard, rollups
+from .models import DeliveryZone, Order, OrderStatus
+from .zones import invalidate_zones
+
+
+@receiver(post_save, sender=DeliveryZone)
+@receiver(post_delete, sender=DeliveryZone)
+def reload_delivery_zones(sender, **kwargs):
+    invalidate_zones()
+
+
+@receiver(post_init, sender=Order)
+def remember_order_status(sender, instance, **kwargs):
+    instance._loaded_status = instance.status
+
+
+@receiver(post_save, sender=Order)
+def count_order_status(sender, instance, created, **kwargs):
+    old_status = instance._loaded_status
+    instance._loaded_status = instance.status
+    if created:
+        transaction.on_commit(lambda: dashboard.record_created(instance))
+    elif old_status != instance.status:
+        transaction.on_commit(lambda: dashboard.record_status_change(instance, old_status))
+
+
+@receiver(pre_delete, sender=Order)
+def uncount_order(sender, instance, **kwargs):
+    # Items are still there before the cascade runs; only today's revenue needs them.
+    total = 0
+    if instance.status != OrderStatus.CANCELED and dashboard.placed_today(instance):
+        total = dashboard.order_total(instance)
+    # The collector clears instance.pk once the row is gone; the callback needs it.
+    order = copy.copy(instance)
+    transaction.on_commit(lambda: dashboard.record_deleted(order, total))
+    rollups.order_deleted(instance)
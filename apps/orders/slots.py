@@ -0,0 +1,93 @@
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import DeliverySlot
+
+AVAILABILITY_KEY = 'delivery-slots:availability'
+AVAILABILITY_TIMEOUT = 5 * 60
+BOOKING_HORIZON = timedelta(days=7)
+
+
+class SlotFull(Exception):
+    pass
+
+
+def refresh_availability():
+    """Rebuild the cached {slot_id: slot} map of upcoming slots that still have room."""
+    now = timezone.now()
+    slots = DeliverySlot.objects.filter(
+        starts_at__gt=now,
+        starts_at__lte=now + BOOKING_HORIZON,
+        booked__lt=F('capacity'),
+    )
+    availability = {
+        slot.id: {
+            'id': slot.id,
+            'starts_at': slot.starts_at,
+            'ends_at': slot.ends_at,
+            'remaining': slot.remaining,
+        }
+        for slot in slots
+    }
+    cache.set(AVAILABILITY_KEY, availability, timeout=AVAILABILITY_TIMEOUT)
+    return availability
+
+
+def available_slots():
+    """Upcoming slots with room, read from the cached map; full slots never appear."""
+    availability = cache.get(AVAILABILITY_KEY)
+    if availability is None:
+        availability = refresh_availability()
+    now = timezone.now()
+    return sorted(
+        (slot for slot in availability.values() if slot['starts_at'] > now),
+        key=lambda slot: slot['starts_at'],
+    )
+
+
+def is_available(slot_id):
+    return any(str(slot['id']) == str(slot_id) for slot in available_slots())
+
+
+def book_slot(slot_id):
+    """Take one place in the slot with a single conditional UPDATE. Raises SlotFull."""
+    booked = DeliverySlot.objects.filter(
+        id=slot_id,
+        starts_at__gt=timezone.now(),
+        booked__lt=F('capacity'),
+    ).update(booked=F('booked') + 1)
+    if not booked:
+        raise SlotFull(slot_id)
+    transaction.on_commit(refresh_availability)
+
+
+def release_slot(slot_id):
+    DeliverySlot.objects.filter(id=slot_id, booked__gt=0).update(booked=F('booked') - 1)
+    transaction.on_commit(refresh_availability)
+
+
+def book_next_slot(slot_id):
+    """
+    Book the earliest upcoming slot with room that starts no earlier than
+    `slot_id` did. Returns the booked slot, or None if every later slot is full.
+    """
+    now = timezone.now()
+    requested = DeliverySlot.objects.filter(id=slot_id).values_list('starts_at', flat=True).first()
+    candidates = DeliverySlot.objects.filter(
+        starts_at__gt=now,
+        starts_at__lte=now + BOOKING_HORIZON,
+        booked__lt=F('capacity'),
+    ).exclude(id=slot_id).order_by('starts_at', 'id')
+    if requested is not None:
+        candidates = candidates.filter(starts_at__gte=requested)
+    for slot in candidates:
+        try:
+            book_slot(slot.id)
+        except SlotFull:
+            continue
+        return slot
+    return None
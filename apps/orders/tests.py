@@ -1,3 +1,483 @@
-from django.test import TestCase
+import asyncio
+import json
+import math
+import warnings
+from datetime import timedelta
 
-# Create your tests here.
+from django.contrib.sessions.backends.cached_db import SessionStore
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from apps.common.geo import haversine_km
+from apps.products.models import Catalog, Product
+from apps.users.models import User
+
+from . import checkout, dashboard, delivery
+from .archive import archive_orders
+from .delivery import quote, quote_many
+from .dispatch import courier_runs, plan_runs
+from .events import broker
+from .models import (
+    ArchivedOrder, DailySales, DeliverySlot, DeliveryZone, Order, OrderAddress, OrderItem, OrderStatus, RollupWatermark,
+)
+from .picking import pick_list
+from .rollups import DAILY_SALES_WATERMARK, rebuild_daily_sales, update_daily_sales
+from .slots import AVAILABILITY_KEY, SlotFull, available_slots, book_next_slot, book_slot, is_available, release_slot
+from .views import EVENTS_POLL_SECONDS
+from .zones import is_deliverable, zone_for
+
+
+def make_product(name, price=10, stock=None):
+    catalog, _ = Catalog.objects.get_or_create(name='Fruit')
+    return Product.objects.create(
+        name=name, price=price, description='', photo='product_photos/p.jpg', catalog=catalog, stock=stock,
+    )
+
+
+def make_order(user, items, status=OrderStatus.ORDERED):
+    order = Order.objects.create(user=user, status=status)
+    for product, quantity in items:
+        OrderItem.objects.create(order=order, product=product, quantity=quantity, price=product.price)
+    return order
+
+
+class DailySalesRollupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('buyer', 'buyer@example.com', 'secret')
+        self.apple = make_product('Apple', price=3)
+
+    def sales(self):
+        return list(DailySales.objects.values_list('product__name', 'quantity', 'revenue', 'order_count'))
+
+    def test_incremental_run_picks_up_changed_orders(self):
+        make_order(self.user, [(self.apple, 2)])
+        self.assertEqual(update_daily_sales(), (1, 1))
+        self.assertEqual(self.sales(), [('Apple', 2, 6, 1)])
+        watermark = RollupWatermark.objects.get(name=DAILY_SALES_WATERMARK).value
+
+        second = make_order(self.user, [(self.apple, 1)])
+        update_daily_sales()
+        self.assertEqual(self.sales(), [('Apple', 3, 9, 2)])
+
+        second.status = OrderStatus.CANCELED
+        second.save()
+        update_daily_sales()
+        self.assertEqual(self.sales(), [('Apple', 2, 6, 1)])
+        self.assertGreater(RollupWatermark.objects.get(name=DAILY_SALES_WATERMARK).value, watermark)
+
+    def test_full_run_rebuilds_days_behind_the_watermark(self):
+        make_order(self.user, [(self.apple, 2)])
+        update_daily_sales()
+        # A watermark past every order (e.g. rows fixed up by hand) leaves nothing for an incremental run.
+        RollupWatermark.objects.update(value=timezone.now() + timedelta(hours=1))
+        DailySales.objects.update(quantity=0)
+
+        self.assertEqual(update_daily_sales(), (0, 0))
+        self.assertEqual(update_daily_sales(full=True), (1, 1))
+        self.assertEqual(self.sales(), [('Apple', 2, 6, 1)])
+
+    def test_revenue_uses_the_price_paid(self):
+        make_order(self.user, [(self.apple, 2)])
+        Product.objects.filter(id=self.apple.id).update(price=100)
+
+        update_daily_sales()
+        self.assertEqual(self.sales(), [('Apple', 2, 6, 1)])
+
+    def test_deleted_orders_leave_the_rollup(self):
+        make_order(self.user, [(self.apple, 2)])
+        second = make_order(self.user, [(self.apple, 1)])
+        update_daily_sales()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+
+        self.assertEqual(self.sales(), [('Apple', 2, 6, 1)])
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user('clerk', 'clerk@example.com', 'secret', is_staff=True)
+        self.client.force_login(self.staff)
+        make_order(self.staff, [(make_product('Pear', price=4), 2)])
+
+    def test_csv_has_one_row_per_item(self):
+        response = self.client.get('/orders/export/', {'from': timezone.localdate().isoformat()})
+
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertIn('Pear', lines[1])
+
+    def test_archived_orders_are_exported(self):
+        old = make_order(self.staff, [(make_product('Quince', price=6), 3)], status=OrderStatus.ACCEPTED)
+        Order.objects.filter(id=old.id).update(updated_at=timezone.now() - timedelta(days=365))
+        archive_orders(days=180)
+
+        response = self.client.get('/orders/export/', {'format': 'jsonl'})
+
+        orders = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(orders), 2)
+        archived = next(order for order in orders if order['order_id'] == old.id)
+        self.assertEqual(archived['status'], 'accepted')
+        self.assertEqual(
+            [(item['product'], item['price'], item['quantity'], item['total']) for item in archived['items']],
+            [('Quince', 6, 3, 18)],
+        )
+
+    def test_malformed_dates_are_rejected(self):
+        self.assertEqual(self.client.get('/orders/export/', {'from': 'abc'}).status_code, 400)
+        self.assertEqual(self.client.get('/orders/export/', {'to': '2024-02-30'}).status_code, 400)
+        with self.assertRaises(CommandError):
+            call_command('export_orders', '--from', 'abc')
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('old', 'old@example.com', 'secret')
+        self.plum = make_product('Plum', price=5)
+
+    def test_terminal_orders_round_trip_into_the_archive(self):
+        order = make_order(self.user, [(self.plum, 3)], status=OrderStatus.ACCEPTED)
+        OrderAddress.objects.create(order=order, address='Main st 1', latitude=41.3, longitude=69.2)
+        open_order = make_order(self.user, [(self.plum, 1)])
+        Order.objects.update(updated_at=timezone.now() - timedelta(days=60))
+
+        self.assertEqual(archive_orders(days=30), 1)
+
+        self.assertQuerySetEqual(Order.objects.all(), [open_order])
+        archived = ArchivedOrder.objects.get(id=order.id)
+        self.assertEqual((archived.address, archived.total), ('Main st 1', 15))
+        self.assertEqual(archived.items[0]['quantity'], 3)
+
+        rebuild_daily_sales([timezone.localdate(archived.created_at)])
+        self.assertEqual(DailySales.objects.get().quantity, 4)  # 3 archived + 1 live
+
+        self.client.force_login(self.user)
+        response = self.client.get('/users/my-orders/', {'archived': '1'})
+        self.assertContains(response, 'Accepted')
+
+    def test_recent_and_open_orders_stay(self):
+        make_order(self.user, [(self.plum, 1)], status=OrderStatus.CANCELED)
+        make_order(self.user, [(self.plum, 1)], status=OrderStatus.DELIVERING)
+        Order.objects.filter(status=OrderStatus.DELIVERING).update(updated_at=timezone.now() - timedelta(days=60))
+
+        self.assertEqual(archive_orders(days=30), 0)
+        self.assertEqual(Order.objects.count(), 2)
+
+
+class PickListTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user('picker', 'picker@example.com', 'secret', is_staff=True)
+        self.apple, self.banana = make_product('Apple'), make_product('Banana')
+        make_order(self.staff, [(self.apple, 2), (self.banana, 1)], status=OrderStatus.COLLECTING)
+        make_order(self.staff, [(self.apple, 3)], status=OrderStatus.COLLECTING)
+        make_order(self.staff, [(self.banana, 7)], status=OrderStatus.ORDERED)
+
+    def test_totals_per_product_for_collecting_orders(self):
+        items = [(item['product__name'], item['quantity'], item['orders']) for item in pick_list()]
+
+        self.assertEqual(items, [('Apple', 5, 2), ('Banana', 1, 1)])
+
+    def test_view_renders_html_and_csv(self):
+        self.client.force_login(self.staff)
+
+        response = self.client.get('/orders/pick-list/')
+        self.assertEqual(response.context['total_quantity'], 6)
+
+        response = self.client.get('/orders/pick-list/', {'format': 'csv'})
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = response.content.decode().splitlines()
+        self.assertEqual(lines[0], 'catalog,product_id,product,quantity,orders')
+        self.assertEqual(lines[1:], [f'Fruit,{self.apple.id},Apple,5,2', f'Fruit,{self.banana.id},Banana,1,1'])
+
+    def test_requires_staff(self):
+        self.client.force_login(User.objects.create_user('shopper', 'shopper@example.com', 'secret'))
+
+        self.assertEqual(self.client.get('/orders/pick-list/').status_code, 302)
+
+
+class DeliverySlotTests(TestCase):
+    def setUp(self):
+        cache.delete(AVAILABILITY_KEY)
+        start = timezone.now() + timedelta(days=1)
+        self.slot = DeliverySlot.objects.create(starts_at=start, ends_at=start + timedelta(hours=2), capacity=2)
+        self.later = DeliverySlot.objects.create(
+            starts_at=start + timedelta(hours=2), ends_at=start + timedelta(hours=4), capacity=1,
+        )
+
+    def test_booking_stops_at_capacity(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            book_slot(self.slot.id)
+            book_slot(self.slot.id)
+        with self.assertRaises(SlotFull):
+            book_slot(self.slot.id)
+
+        self.slot.refresh_from_db()
+        self.assertEqual(self.slot.booked, 2)
+        self.assertFalse(is_available(self.slot.id))
+        self.assertEqual([slot['id'] for slot in available_slots()], [self.later.id])
+
+    def test_release_frees_a_place(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            book_slot(self.later.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            release_slot(self.later.id)
+
+        self.assertTrue(is_available(self.later.id))
+
+    def test_full_slot_falls_through_to_the_next_free_one(self):
+        DeliverySlot.objects.filter(id=self.slot.id).update(booked=2)
+
+        self.assertEqual(book_next_slot(self.slot.id), self.later)
+        self.assertIsNone(book_next_slot(self.slot.id))
+        self.later.refresh_from_db()
+        self.assertEqual(self.later.booked, 1)
+
+
+class DashboardTests(TestCase):
+    def setUp(self):
+        cache.delete(dashboard.READY_KEY)
+        self.user = User.objects.create_user('buyer', 'buyer@example.com', 'secret')
+        self.fig = make_product('Fig', price=3)
+        make_order(self.user, [(self.fig, 2)])
+
+    def counts(self, data):
+        return {entry['status']: entry['count'] for entry in data['statuses']}
+
+    def test_counters_follow_order_writes_without_a_rebuild(self):
+        self.assertEqual(dashboard.snapshot()['revenue_today'], 6)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            order = make_order(self.user, [(self.fig, 4)])
+            dashboard.record_placed(order, 12)
+        with self.captureOnCommitCallbacks(execute=True):
+            order.status = OrderStatus.CANCELED
+            order.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            first = Order.objects.get(status=OrderStatus.ORDERED)
+            first.status = OrderStatus.COLLECTING
+            first.save()
+
+        with self.assertNumQueries(0):
+            live = dashboard.snapshot()
+        self.assertEqual(self.counts(live)[OrderStatus.COLLECTING], 1)
+        self.assertEqual(self.counts(live)[OrderStatus.CANCELED], 1)
+        self.assertEqual(self.counts(live)[OrderStatus.ORDERED], 0)
+        self.assertEqual(live['revenue_today'], 6)
+        self.assertEqual([entry['status'] for entry in live['recent']], [OrderStatus.CANCELED, OrderStatus.COLLECTING])
+
+        cache.delete(dashboard.READY_KEY)
+        rebuilt = dashboard.snapshot()
+        self.assertEqual(self.counts(live), self.counts(rebuilt))
+        self.assertEqual(live['revenue_today'], rebuilt['revenue_today'])
+
+    def test_deleting_an_order_uncounts_it(self):
+        dashboard.snapshot()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.get().delete()
+
+        data = dashboard.snapshot()
+        self.assertEqual(self.counts(data)[OrderStatus.ORDERED], 0)
+        self.assertEqual(data['revenue_today'], 0)
+        self.assertEqual(data['recent'], [])
+
+    def test_json_view_is_staff_only(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get('/orders/dashboard/', {'format': 'json'}).status_code, 302)
+
+        self.client.force_login(User.objects.create_user('boss', 'boss@example.com', 'secret', is_staff=True))
+        data = self.client.get('/orders/dashboard/', {'format': 'json'}).json()
+        self.assertEqual(data['revenue_today'], 6)
+
+
+class CourierRunTests(TestCase):
+    def test_nearby_stops_share_a_run_and_far_ones_do_not(self):
+        coordinates = [(41.30, 69.20), (41.60, 69.80), (41.301, 69.201), (41.302, 69.203)]
+
+        runs = plan_runs(coordinates, cell_km=3)
+
+        self.assertEqual(sorted(sorted(indexes) for indexes, _ in runs), [[0, 2, 3], [1]])
+        self.assertEqual(runs[1][1], 0.0)
+        self.assertGreater(runs[0][1], 0)
+
+    def test_large_cells_are_cut_at_max_stops(self):
+        coordinates = [(41.3 + step * 0.001, 69.2) for step in range(5)]
+
+        runs = plan_runs(coordinates, cell_km=10, max_stops=2)
+
+        self.assertEqual([len(indexes) for indexes, _ in runs], [2, 2, 1])
+        self.assertEqual(sorted(index for indexes, _ in runs for index in indexes), [0, 1, 2, 3, 4])
+
+    def test_empty_and_unusable_input(self):
+        self.assertEqual(plan_runs([]), [])
+        self.assertEqual(plan_runs([(float('nan'), 69.2)]), [])
+
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            runs = plan_runs([(41.3, 69.2), (float('nan'), 69.2), (41.301, float('inf'))])
+        self.assertEqual(runs, [([0], 0.0)])
+
+    def test_orders_with_invalid_addresses_are_skipped(self):
+        user = User.objects.create_user('courier', 'courier@example.com', 'secret')
+        good = make_order(user, [], status=OrderStatus.COLLECTING)
+        bad = make_order(user, [], status=OrderStatus.DELIVERING)
+        OrderAddress.objects.create(order=good, address='A', latitude=41.3, longitude=69.2)
+        OrderAddress.objects.create(order=bad, address='B', latitude=float('inf'), longitude=69.2)
+
+        runs = courier_runs()
+
+        self.assertEqual([[order.id for order in run['orders']] for run in runs], [[good.id]])
+
+
+DEPOTS = [
+    {'name': 'North', 'latitude': 41.40, 'longitude': 69.20},
+    {'name': 'South', 'latitude': 41.20, 'longitude': 69.20},
+]
+
+
+@override_settings(
+    DELIVERY_DEPOTS=DEPOTS, DELIVERY_BASE_FEE=2.0, DELIVERY_FEE_PER_KM=0.5,
+    DELIVERY_PREP_MINUTES=20, DELIVERY_SPEED_KMH=30.0,
+)
+class DeliveryQuoteTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_quote_uses_the_nearest_depot(self):
+        result = quote(41.38, 69.2)
+
+        distance = haversine_km(41.38, 69.2, 41.40, 69.20)
+        self.assertEqual(result['depot'], 'North')
+        self.assertEqual(result['distance_km'], round(distance, 2))
+        self.assertEqual(result['fee'], round(2.0 + 0.5 * distance, 2))
+        self.assertEqual(result['eta_minutes'], math.ceil(20 + distance / 30 * 60))
+
+    def test_batch_matches_single_quotes_and_skips_unusable_points(self):
+        coordinates = [(41.21, 69.2), ('nan', 69.2), (41.39, 69.21), (41.21, 69.2), (41.3, float('inf')), (None, 1)]
+
+        results = quote_many(coordinates)
+
+        depots = [result and result['depot'] for result in results]
+        self.assertEqual(depots, ['South', None, 'North', 'South', None, None])
+        cache.clear()
+        self.assertEqual(results[2], quote(41.39, 69.21))
+
+    def test_quotes_are_cached_per_settings_version(self):
+        first = quote(41.3801, 69.2)
+        # Same ~100 m square, so the same cache entry.
+        cache.set(delivery._cache_key(delivery._settings_version(), 41.38, 69.2), {**first, 'fee': 99.0})
+
+        self.assertEqual(quote(41.3804, 69.2)['fee'], 99.0)
+        with self.settings(DELIVERY_BASE_FEE=5.0):
+            self.assertEqual(quote(41.3804, 69.2)['fee'], round(first['fee'] + 3.0, 2))
+
+    def test_quote_view_rejects_non_finite_coordinates(self):
+        self.client.force_login(User.objects.create_user('quoter', 'quoter@example.com', 'secret'))
+
+        self.assertEqual(self.client.get('/cart/quote/', {'latitude': 'nan', 'longitude': '69.2'}).status_code, 400)
+        response = self.client.get('/cart/quote/', {'latitude': '41.3', 'longitude': '69.2'})
+        self.assertEqual(response.json()['depot'], 'North')
+
+
+class DeliveryZoneTests(TestCase):
+    def setUp(self):
+        self.zone = DeliveryZone.objects.create(
+            name='Center', polygon=[[41.2, 69.1], [41.2, 69.4], [41.4, 69.4], [41.4, 69.1]],
+        )
+
+    def test_point_lookup(self):
+        self.assertEqual(zone_for(41.3, 69.2).id, self.zone.id)
+        self.assertEqual(zone_for('41.3', '69.2').id, self.zone.id)
+        self.assertIsNone(zone_for(41.5, 69.2))
+        self.assertFalse(is_deliverable(41.5, 69.2))
+
+    def test_invalid_coordinates_are_not_deliverable(self):
+        for latitude, longitude in (('nan', '69.2'), ('41.3', 'inf'), ('-inf', 'nan'), ('abc', '1'), (None, None)):
+            self.assertIsNone(zone_for(latitude, longitude))
+            self.assertFalse(is_deliverable(latitude, longitude))
+
+    def test_edits_rebuild_the_index(self):
+        self.zone.is_active = False
+        self.zone.save()
+        self.assertIsNone(zone_for(41.3, 69.2))
+        self.assertTrue(is_deliverable(41.5, 69.2))
+
+
+class CheckoutSessionTests(TestCase):
+    def reopen(self, session):
+        session.save()
+        # Drop the cached copy so the payload is read back from the database row.
+        cache.delete(session.cache_key)
+        return SessionStore(session.session_key)
+
+    def test_pending_checkout_round_trips_through_the_session(self):
+        session = SessionStore()
+        checkout.save(session, 'key-1', {'3': 2, 7: 1}, '1 Main St', 41.31, 69.28, '2026-10-20T09:00')
+
+        session = self.reopen(session)
+        self.assertEqual(checkout.pending_key(session), 'key-1')
+        self.assertEqual(checkout.load(session), {
+            'key': 'key-1',
+            'order_dict': {3: 2, 7: 1},
+            'address': '1 Main St',
+            'latitude': 41.31,
+            'longitude': 69.28,
+            'slot': '2026-10-20T09:00',
+        })
+
+        checkout.clear(session)
+        session = self.reopen(session)
+        self.assertIsNone(checkout.load(session))
+        self.assertIsNone(checkout.pending_key(session))
+        self.assertNotIn(checkout.SESSION_KEY, session)
+
+    def test_missing_address_loads_as_empty(self):
+        session = SessionStore()
+        checkout.save(session, 'key-2', {1: 1}, None, 41.31, 69.28, None)
+
+        loaded = checkout.load(self.reopen(session))
+        self.assertEqual(loaded['address'], '')
+        self.assertIsNone(loaded['slot'])
+
+
+class OrderEventsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('watcher', 'watcher@example.com', 'secret')
+        self.order = make_order(self.user, [(make_product('Kiwi'), 1)], status=OrderStatus.COLLECTING)
+
+    async def test_stream_sends_current_state_then_published_changes(self):
+        await self.async_client.aforce_login(self.user)
+
+        response = await self.async_client.get('/orders/events/')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+
+        first = await asyncio.wait_for(anext(stream), timeout=5)
+        self.assertIn(f'"id": {self.order.id}, "status": "collecting"', first.decode())
+
+        broker.publish(self.user.id, {'id': self.order.id, 'status': 'delivering', 'label': 'Delivering'})
+        second = await asyncio.wait_for(anext(stream), timeout=5)
+        self.assertEqual(second.decode().splitlines()[0], 'event: status')
+        self.assertIn('"status": "delivering"', second.decode())
+        await stream.aclose()
+
+    async def test_anonymous_users_are_rejected(self):
+        response = await self.async_client.get('/orders/events/')
+        self.assertEqual(response.status_code, 401)
+
+    def test_wsgi_falls_back_to_polling(self):
+        delivered = make_order(self.user, [], status=OrderStatus.ACCEPTED)
+        old = make_order(self.user, [], status=OrderStatus.ACCEPTED)
+        Order.objects.filter(id=old.id).update(updated_at=timezone.now() - timedelta(hours=1))
+        self.client.force_login(self.user)
+
+        response = self.client.get('/orders/events/')
+
+        self.assertFalse(response.streaming)
+        body = response.content.decode()
+        self.assertTrue(body.startswith(f'retry: {EVENTS_POLL_SECONDS * 1000}\n\n'))
+        self.assertIn(f'"id": {self.order.id},', body)
+        self.assertIn(f'"id": {delivered.id},', body)
+        self.assertNotIn(f'"id": {old.id},', body)
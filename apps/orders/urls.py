@@ -7,5 +7,10 @@ urlpatterns = [
     path('create_order/', views.create_order, name='create_order'),
     path('orders/<int:order_id>/update-status/', views.update_order_status, name='update_order_status'),
     path('delete_order/<int:order_id>/', views.delete_order, name='delete_order'),
-    path('cancel/<int:order_id>/', views.cancel_order, name='cancel')
+    path('cancel/<int:order_id>/', views.cancel_order, name='cancel'),
+    path('export/', views.export_orders, name='export'),
+    path('runs/', views.delivery_runs, name='runs'),
+    path('pick-list/', views.pick_list, name='pick_list'),
+    path('events/', views.order_events, name='events'),
+    path('dashboard/', views.order_dashboard, name='dashboard'),
 ]
\ No newline at end of file
@@ -1,13 +1,49 @@
 from django.shortcuts import render, redirect
-from .models import Order, OrderItem, OrderAddress, OrderStatus
+from .models import Order, OrderItem, OrderAddress, OrderStatus, ArchivedOrder, CheckoutRequest
 from django.contrib import messages
 from apps.products.models import Product
+from apps.products.models import StockReservation
+from apps.products.stock import ReservationExpired, confirm_reservations, release_reservations
+from apps.cart.models import CartItem
 from django.shortcuts import redirect, get_object_or_404
 from .models import Order
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import StreamingHttpResponse
+from django.core.paginator import Paginator
+from django.utils import timezone
+from django.db import IntegrityError, transaction
+import uuid
+from .exports import EXPORT_FORMATS, archived_export_queryset, export_queryset, export_lines, parse_export_date
+from .dispatch import DEFAULT_CELL_KM, DEFAULT_MAX_STOPS, courier_runs
+from .picking import pick_list as collecting_pick_list
+from .slots import SlotFull, book_next_slot, book_slot, release_slot
+from .events import broker, order_event, publish_order_status
+from . import checkout, dashboard
+from django.http import JsonResponse
+from .archive import TERMINAL_STATUSES
+import asyncio
+import json
+from datetime import timedelta
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Q
+from django.http import HttpResponse, HttpResponseBadRequest
+import csv
+
+ARCHIVE_PAGE_SIZE = 50
+# The goods have left the store; deleting such an order must not put them back into stock.
+FULFILLED_STATUSES = [OrderStatus.DELIVERING, OrderStatus.SHIPPED, OrderStatus.ACCEPTED]
+EVENTS_KEEPALIVE_SECONDS = 15
+# Reconnect interval for the polling fallback when not served through ASGI.
+EVENTS_POLL_SECONDS = 10
 
 # Create your views here.
 def list_orders(request):
+    if request.GET.get('archived') == '1' and request.user.is_staff:
+        orders = ArchivedOrder.objects.select_related('user').order_by('-created_at')
+        orders = Paginator(orders, ARCHIVE_PAGE_SIZE).get_page(request.GET.get('page'))
+        return render(request, 'orders.html', {'orders': orders, 'archived': True})
+
     orders = Order.objects.all().order_by('-created_at')
     order_items = OrderItem.objects.all()
 
@@ -15,39 +51,96 @@ def list_orders(request):
 
     return render(request, 'orders.html', {'orders': orders, 'choices': choices})
 
+def _release_holds(order):
+    """Return the stock and delivery slot held by an order that will not be delivered."""
+    release_reservations(order.reservations.all())
+    if order.delivery_slot_id:
+        release_slot(order.delivery_slot_id)
+        order.delivery_slot = None
+        order.save(update_fields=['delivery_slot'])
+
 def create_order(request):
     user = request.user
-    order_dict = request.session.get('order_dict', {})
-    address = request.session.get('address', '')
-    latitude = request.session.get('latitude')
-    longitude = request.session.get('longitude')
+    pending = checkout.load(request.session) or {}
+    order_dict = pending.get('order_dict', {})
+    checkout_key = pending.get('key') or str(uuid.uuid4())
 
     #ORDER CREATING LOGIC HERE
 
     if not order_dict:
+        if CheckoutRequest.objects.filter(key=checkout_key, user=user, order__isnull=False).exists():
+            return redirect('users:my-orders')
         messages.error(request, "Cart is empty")
         return redirect('cart:cart')
-    
-    order = Order.objects.create(user = user)
-
-    order_address = OrderAddress.objects.create(
-        order = order,
-        address = address,
-        latitude = latitude,
-        longitude = longitude
-    )
-    
-    for key, value in order_dict.items():
-        product = Product.objects.get(id = key)
-        OrderItem.objects.create(product = product, order = order, quantity = value)
-
-    request.session.pop('order_dict', None)
-    request.session.pop('address', None)
-    request.session.pop('latitude', None)
-    request.session.pop('longitude', None)
+
+    try:
+        order = _place_order(request, user, pending, checkout_key)
+    except ReservationExpired:
+        # Everything written above was rolled back; give back whatever is still held and refill the cart.
+        release_reservations(StockReservation.objects.filter(checkout_key=checkout_key, order__isnull=True))
+        cart = request.account.cart
+        CartItem.objects.bulk_create([
+            CartItem(cart=cart, product_id=product_id)
+            for product_id, quantity in order_dict.items()
+            for _ in range(quantity)
+        ])
+        checkout.clear(request.session)
+        messages.error(request, "Your checkout took too long and the items were released. Please check out again.")
+        return redirect('cart:cart')
+    if order is None:
+        checkout.clear(request.session)
+        messages.info(request, "This order has already been placed.")
+        return redirect('users:my-orders')
+
+    checkout.clear(request.session)
 
     return redirect('users:my-orders')
 
+def _place_order(request, user, pending, checkout_key):
+    """Write the order for a pending checkout; None if this checkout was already placed."""
+    order_dict = pending['order_dict']
+    with transaction.atomic():
+        try:
+            # The unique key makes a replayed submission stop here, before any order rows are written.
+            with transaction.atomic():
+                checkout_request = CheckoutRequest.objects.create(key=checkout_key, user=user)
+        except IntegrityError:
+            return None
+
+        delivery_slot = pending.get('slot')
+        if delivery_slot:
+            try:
+                book_slot(delivery_slot)
+            except SlotFull:
+                next_slot = book_next_slot(delivery_slot)
+                if next_slot:
+                    delivery_slot = next_slot.id
+                    messages.warning(request, f"Your delivery slot filled up before the order was placed; we moved it to {next_slot}.")
+                else:
+                    delivery_slot = None
+                    messages.warning(request, "Your delivery slot filled up before the order was placed and no later slot is free; we will contact you to arrange delivery.")
+
+        order = Order.objects.create(user = user, delivery_slot_id = delivery_slot)
+
+        order_address = OrderAddress.objects.create(
+            order = order,
+            address = pending['address'],
+            latitude = pending['latitude'],
+            longitude = pending['longitude']
+        )
+
+        total = 0
+        for key, value in order_dict.items():
+            product = Product.objects.get(id = key)
+            OrderItem.objects.create(product = product, order = order, quantity = value, price = product.price)
+            total += product.price * value
+
+        checkout_request.order = order
+        checkout_request.save(update_fields=['order'])
+        confirm_reservations(checkout_key, order, expected=len(order_dict))
+        transaction.on_commit(lambda: dashboard.record_placed(order, total))
+    return order
+
 @login_required
 def update_order_status(request, order_id):
     if request.method == 'POST':
@@ -55,11 +148,17 @@ def update_order_status(request, order_id):
         new_status = request.POST.get('status')
         order.status = new_status
         order.save()
+        publish_order_status(order)
+        if new_status == OrderStatus.CANCELED:
+            _release_holds(order)
     return redirect('orders:list')
 
 @login_required
 def delete_order(request, order_id):
-    Order.objects.get(id = order_id).delete()
+    order = Order.objects.get(id = order_id)
+    if order.status not in FULFILLED_STATUSES:
+        _release_holds(order)
+    order.delete()
     return redirect('orders:list')
 
 @login_required
@@ -67,4 +166,123 @@ def cancel_order(request, order_id):
     order = Order.objects.get(id = order_id)
     order.status = OrderStatus.CANCELED
     order.save()
-    return redirect('users:my-orders')
\ No newline at end of file
+    publish_order_status(order)
+    _release_holds(order)
+    return redirect('users:my-orders')
+
+@staff_member_required
+def export_orders(request):
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        export_format = 'csv'
+
+    try:
+        date_from = parse_export_date(request.GET.get('from'))
+        date_to = parse_export_date(request.GET.get('to'))
+    except ValueError as error:
+        return HttpResponseBadRequest(str(error))
+
+    filters = {'date_from': date_from, 'date_to': date_to, 'status': request.GET.get('status') or None}
+    orders = export_queryset(**filters)
+    archived = archived_export_queryset(**filters)
+    content_type = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    filename = f"orders-{timezone.localdate():%Y%m%d}.{export_format}"
+
+    response = StreamingHttpResponse(export_lines(orders, export_format, archived=archived), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+@staff_member_required
+def delivery_runs(request):
+    try:
+        cell_km = max(0.5, float(request.GET.get('cell_km', DEFAULT_CELL_KM)))
+        max_stops = max(1, int(request.GET.get('max_stops', DEFAULT_MAX_STOPS)))
+    except ValueError:
+        cell_km, max_stops = DEFAULT_CELL_KM, DEFAULT_MAX_STOPS
+
+    runs = courier_runs(cell_km=cell_km, max_stops=max_stops)
+    return render(request, 'runs.html', {'runs': runs, 'cell_km': cell_km, 'max_stops': max_stops})
+
+
+@staff_member_required
+def pick_list(request):
+    items = list(collecting_pick_list())
+
+    if request.GET.get('format') == 'csv':
+        response = HttpResponse(content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="pick-list-{timezone.localdate():%Y%m%d}.csv"'
+        writer = csv.writer(response)
+        writer.writerow(['catalog', 'product_id', 'product', 'quantity', 'orders'])
+        for item in items:
+            writer.writerow([
+                item['product__catalog__name'], item['product_id'], item['product__name'],
+                item['quantity'], item['orders'],
+            ])
+        return response
+
+    return render(request, 'pick_list.html', {
+        'items': items,
+        'total_quantity': sum(item['quantity'] for item in items),
+        'generated_at': timezone.localtime(),
+    })
+
+
+def _sse(event):
+    return f"event: status\ndata: {json.dumps(event)}\n\n"
+
+async def order_events(request):
+    """
+    Server-Sent Events stream of status changes for the user's open orders.
+    Under core.asgi the connection stays open and is fed by the broker. A WSGI
+    worker cannot hold it, so there the current state is sent with a `retry`
+    hint and the response ends; EventSource reconnects, i.e. polls.
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return HttpResponse(status=401)
+
+    if not isinstance(request, ASGIRequest):
+        # Orders that just reached a terminal status are included once more so
+        # the page sees the final change.
+        since = timezone.now() - timedelta(seconds=2 * EVENTS_POLL_SECONDS)
+        orders = Order.objects.filter(user_id=user.id).filter(
+            ~Q(status__in=TERMINAL_STATUSES) | Q(updated_at__gte=since)
+        )
+        body = [f"retry: {EVENTS_POLL_SECONDS * 1000}\n\n"]
+        async for order in orders.only('id', 'status'):
+            body.append(_sse(order_event(order)))
+        response = HttpResponse(''.join(body), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+    async def stream():
+        subscriber = broker.subscribe(user.id)
+        try:
+            # Current state first, so a reconnecting client never misses a change.
+            open_orders = Order.objects.filter(user_id=user.id).exclude(status__in=TERMINAL_STATUSES)
+            async for order in open_orders.only('id', 'status'):
+                yield _sse(order_event(order))
+            _, queue = subscriber
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=EVENTS_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield _sse(event)
+        finally:
+            broker.unsubscribe(user.id, subscriber)
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@staff_member_required
+def order_dashboard(request):
+    data = dashboard.snapshot()
+    if request.GET.get('format') == 'json':
+        return JsonResponse(data)
+    return render(request, 'dashboard.html', data)
@@ -0,0 +1,123 @@
+import math
+import threading
+import uuid
+
+from django.core.cache import cache
+
+from apps.common.geo import grid_cell
+
+from .models import DeliveryZone
+
+ZONES_VERSION_KEY = 'delivery-zones:version'
+
+# Zones are bucketed into a coarse grid so a lookup only tests the polygons
+# whose bounding box touches the point's cell.
+INDEX_CELL_DEGREES = 0.1
+MAX_INDEX_CELLS = 10000
+
+
+def _cell(latitude, longitude):
+    return (math.floor(latitude / INDEX_CELL_DEGREES), math.floor(longitude / INDEX_CELL_DEGREES))
+
+
+def point_in_polygon(latitude, longitude, polygon):
+    """Even-odd ray casting; polygon is a sequence of (latitude, longitude)."""
+    inside = False
+    previous_lat, previous_lng = polygon[-1]
+    for lat, lng in polygon:
+        if (lat > latitude) != (previous_lat > latitude):
+            crossing = lng + (latitude - lat) * (previous_lng - lng) / (previous_lat - lat)
+            if longitude < crossing:
+                inside = not inside
+        previous_lat, previous_lng = lat, lng
+    return inside
+
+
+class Zone:
+    __slots__ = ('id', 'name', 'polygon', 'min_lat', 'max_lat', 'min_lng', 'max_lng')
+
+    def __init__(self, zone):
+        self.id = zone.id
+        self.name = zone.name
+        self.polygon = tuple((float(lat), float(lng)) for lat, lng in zone.polygon)
+        latitudes = [lat for lat, _ in self.polygon]
+        longitudes = [lng for _, lng in self.polygon]
+        self.min_lat, self.max_lat = min(latitudes), max(latitudes)
+        self.min_lng, self.max_lng = min(longitudes), max(longitudes)
+
+    def contains(self, latitude, longitude):
+        if not (self.min_lat <= latitude <= self.max_lat and self.min_lng <= longitude <= self.max_lng):
+            return False
+        return point_in_polygon(latitude, longitude, self.polygon)
+
+
+class ZoneIndex:
+    def __init__(self, zones):
+        self.zones = [Zone(zone) for zone in zones]
+        self.cells = {}
+        self.oversized = []
+        for zone in self.zones:
+            first_row, first_column = _cell(zone.min_lat, zone.min_lng)
+            last_row, last_column = _cell(zone.max_lat, zone.max_lng)
+            if (last_row - first_row + 1) * (last_column - first_column + 1) > MAX_INDEX_CELLS:
+                self.oversized.append(zone)
+                continue
+            for row in range(first_row, last_row + 1):
+                for column in range(first_column, last_column + 1):
+                    self.cells.setdefault((row, column), []).append(zone)
+
+    def find(self, latitude, longitude):
+        for zone in self.cells.get(_cell(latitude, longitude), ()):
+            if zone.contains(latitude, longitude):
+                return zone
+        for zone in self.oversized:
+            if zone.contains(latitude, longitude):
+                return zone
+        return None
+
+
+_lock = threading.Lock()
+_index = None
+_index_version = None
+
+
+def get_index():
+    """
+    The process-local zone index, rebuilt when another process (or an admin
+    edit) has bumped the shared version key in the cache.
+    """
+    global _index, _index_version
+    version = cache.get(ZONES_VERSION_KEY)
+    if version is None:
+        cache.add(ZONES_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+        version = cache.get(ZONES_VERSION_KEY)
+    # Read the global once: invalidate_zones() may reset it at any moment.
+    index = _index
+    if index is None or version != _index_version:
+        with _lock:
+            index = _index
+            if index is None or version != _index_version:
+                index = ZoneIndex(DeliveryZone.objects.filter(is_active=True))
+                _index, _index_version = index, version
+    return index
+
+
+def invalidate_zones():
+    global _index
+    cache.set(ZONES_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+    _index = None
+
+
+def zone_for(latitude, longitude):
+    if grid_cell(latitude, longitude) is None:
+        return None
+    latitude, longitude = float(latitude), float(longitude)
+    return get_index().find(latitude, longitude)
+
+
+def is_deliverable(latitude, longitude):
+    """True if the point is inside an active zone; with no zones configured everything is deliverable."""
+    index = get_index()
+    if not index.zones:
+        return True
+    return zone_for(latitude, longitude) is not None
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Catalog, Product
+from .models import Catalog, Product, StockReservation
 
 
 @admin.register(Catalog)
@@ -10,6 +10,14 @@ class CatalogAdmin(admin.ModelAdmin):
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ['id', 'name', 'price', 'catalog']
+    list_display = ['id', 'name', 'price', 'stock', 'catalog']
+    list_editable = ['stock']
     list_filter = ['catalog']
     search_fields = ['name', 'description']
+
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ['id', 'product', 'user', 'quantity', 'order', 'expires_at']
+    list_filter = ['product']
+    list_select_related = ['product', 'user']
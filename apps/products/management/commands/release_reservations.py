@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from apps.products.stock import release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = "Return stock held by checkout reservations that expired without becoming an order."
+
+    def handle(self, *args, **options):
+        released = release_expired_reservations()
+        self.stdout.write(self.style.SUCCESS(f"Released {released} reservation(s)."))
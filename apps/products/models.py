@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.db import models
 
 # Create your models here.
@@ -13,6 +14,22 @@ class Product(models.Model):
     description = models.TextField()
     photo = models.ImageField(upload_to='product_photos/')
     catalog = models.ForeignKey(Catalog, on_delete=models.CASCADE, related_name='products')
+    # Empty means stock is not tracked for this product and it never sells out.
+    stock = models.PositiveIntegerField(null=True, blank=True)
 
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return self.name
+
+
+class StockReservation(models.Model):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='stock_reservations')
+    quantity = models.PositiveIntegerField()
+    checkout_key = models.UUIDField(db_index=True)
+    order = models.ForeignKey('orders.Order', on_delete=models.CASCADE, null=True, blank=True, related_name='reservations')
+    # Cleared once the order is placed; pending reservations past this time are released by the sweeper.
+    expires_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.quantity} x {self.product_id} for {self.user_id}'
\ No newline at end of file
@@ -0,0 +1,78 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Product, StockReservation
+
+
+class OutOfStock(Exception):
+    def __init__(self, product_id):
+        self.product_id = product_id
+        super().__init__(f"Not enough stock for product {product_id}")
+
+
+class ReservationExpired(Exception):
+    """Some of a checkout's reservations were released (by the sweeper) before the order was placed."""
+
+
+def reserve_stock(user, items, checkout_key):
+    """
+    Take `items` ({product_id: quantity}) out of stock and hold them for the
+    checkout. Products are locked in id order so concurrent checkouts never
+    deadlock, and each product costs a single conditional UPDATE. Raises
+    OutOfStock (rolling back every earlier decrement) if any product is short.
+    """
+    expires_at = timezone.now() + timedelta(minutes=settings.STOCK_RESERVATION_MINUTES)
+    reservations = []
+    with transaction.atomic():
+        for product_id in sorted(items, key=int):
+            quantity = items[product_id]
+            # NULL stock means untracked; NULL - quantity stays NULL.
+            updated = Product.objects.filter(
+                Q(stock__isnull=True) | Q(stock__gte=quantity), id=product_id
+            ).update(stock=F('stock') - quantity)
+            if not updated:
+                raise OutOfStock(product_id)
+            reservations.append(StockReservation(
+                product_id=product_id,
+                user=user,
+                quantity=quantity,
+                checkout_key=checkout_key,
+                expires_at=expires_at,
+            ))
+        StockReservation.objects.bulk_create(reservations)
+    return reservations
+
+
+def confirm_reservations(checkout_key, order, expected):
+    """
+    Attach the checkout's pending reservations to the order so the sweeper
+    leaves them alone. Raises ReservationExpired if fewer than `expected`
+    are still there: that stock has gone back on sale and may be sold again.
+    """
+    confirmed = StockReservation.objects.filter(checkout_key=checkout_key, order__isnull=True).update(
+        order=order, expires_at=None
+    )
+    if confirmed < expected:
+        raise ReservationExpired(checkout_key)
+    return confirmed
+
+
+def release_reservations(reservations):
+    """Put reserved quantities back into stock. Returns the number of reservations released."""
+    released = 0
+    for reservation in reservations.order_by('product_id', 'id'):
+        with transaction.atomic():
+            # Deleting first means two concurrent sweeps can't both return the same stock.
+            deleted, _ = StockReservation.objects.filter(id=reservation.id).delete()
+            if deleted:
+                Product.objects.filter(id=reservation.product_id).update(stock=F('stock') + reservation.quantity)
+                released += 1
+    return released
+
+
+def release_expired_reservations():
+    return release_reservations(StockReservation.objects.filter(expires_at__lt=timezone.now()))
@@ -1,3 +1,82 @@
+import uuid
+from datetime import timedelta
+
 from django.test import TestCase
+from django.utils import timezone
+
+from apps.cart.models import CartItem
+from apps.cart.tests import CheckoutTestCase
+from apps.orders.models import Order, OrderStatus
+from apps.orders.tests import make_product
+from apps.users.models import User
+
+from .models import StockReservation
+from .stock import OutOfStock, release_expired_reservations, reserve_stock
+
+
+class ReserveStockTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('stock', 'stock@example.com', 'secret')
+        self.kiwi = make_product('Kiwi', stock=3)
+        self.lime = make_product('Lime', stock=1)
+
+    def test_short_product_rolls_back_the_whole_reservation(self):
+        with self.assertRaises(OutOfStock) as raised:
+            reserve_stock(self.user, {self.kiwi.id: 2, self.lime.id: 2}, uuid.uuid4())
+
+        self.assertEqual(raised.exception.product_id, self.lime.id)
+        self.kiwi.refresh_from_db()
+        self.assertEqual(self.kiwi.stock, 3)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_sweeper_returns_expired_reservations(self):
+        reserve_stock(self.user, {self.kiwi.id: 2}, uuid.uuid4())
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+
+        self.assertEqual(release_expired_reservations(), 1)
+        self.kiwi.refresh_from_db()
+        self.assertEqual(self.kiwi.stock, 3)
+
+
+class CheckoutStockTests(CheckoutTestCase):
+    def test_out_of_stock_checkout_keeps_the_cart(self):
+        self.fill_cart(6)
+
+        response = self.checkout()
+
+        self.assertContains(response, 'Not enough stock')
+        self.assertEqual(CartItem.objects.filter(cart=self.user.cart).count(), 6)
+        self.assertFalse(Order.objects.exists())
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 5)
+
+    def test_reservation_released_before_the_order_is_placed(self):
+        self.fill_cart(2)
+        self.client.post('/cart/', {'checkout_key': str(uuid.uuid4()), 'address': 'Main st 1',
+                                    'latitude': '41.3', 'longitude': '69.2'})
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+        release_expired_reservations()
+
+        response = self.client.get('/orders/create_order/', follow=True)
+
+        self.assertRedirects(response, '/cart/')
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(CartItem.objects.filter(cart=self.user.cart).count(), 2)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 5)
+
+    def test_deleting_an_order_returns_stock_only_until_it_ships(self):
+        self.fill_cart(2)
+        self.checkout()
+        shipped = Order.objects.get()
+        Order.objects.filter(id=shipped.id).update(status=OrderStatus.SHIPPED)
+
+        self.client.get(f'/orders/delete_order/{shipped.id}/')
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 3)
 
-# Create your tests here.
+        self.fill_cart(1)
+        self.checkout()
+        self.client.get(f'/orders/delete_order/{Order.objects.get().id}/')
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 3)
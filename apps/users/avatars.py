@@ -0,0 +1,73 @@
+import io
+import logging
+import uuid
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .models import UserProfile
+
+logger = logging.getLogger(__name__)
+
+# Rendered in 100px circles: the small size for 1x screens, the large one for 2x.
+AVATAR_SIZE = 200
+AVATAR_SMALL_SIZE = 100
+JPEG_QUALITY = 85
+
+IMAGE_FIELDS = ('photo', 'avatar', 'avatar_small')
+
+
+def _render(image, size):
+    square = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    # Saved without exif=..., so no metadata (GPS, camera) is carried over.
+    square.save(buffer, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return ContentFile(buffer.getvalue())
+
+
+def delete_files(profile, fields=IMAGE_FIELDS):
+    """Remove the stored files behind `fields` and clear them (without saving)."""
+    for name in fields:
+        image = getattr(profile, name)
+        if image:
+            image.delete(save=False)
+
+
+def process(profile):
+    """
+    Turn profile.photo into the fixed avatar sizes: rotated upright from its
+    EXIF orientation, centre-cropped square, resized and re-encoded as JPEG
+    with no metadata. The original upload is deleted afterwards.
+
+    The row is only updated while it still holds the same photo, so an upload
+    or delete that lands during processing is never overwritten.
+    """
+    photo = profile.photo.name
+    current = UserProfile.objects.filter(pk=profile.pk, photo=photo)
+    try:
+        with profile.photo.open('rb') as upload, Image.open(upload) as image:
+            # For JPEGs, decode at a reduced scale that is still at least the largest size.
+            image.draft('RGB', (AVATAR_SIZE * 2, AVATAR_SIZE * 2))
+            image = ImageOps.exif_transpose(image).convert('RGB')
+            large = _render(image, AVATAR_SIZE)
+            small = _render(image, AVATAR_SMALL_SIZE)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError):
+        logger.warning("Discarding unreadable profile photo %s", photo, exc_info=True)
+        if current.update(photo=''):
+            profile.photo.storage.delete(photo)
+        return
+
+    replaced = [profile.avatar.name, profile.avatar_small.name]
+    token = uuid.uuid4().hex[:12]
+    profile.avatar.save(f'{profile.pk}-{token}-{AVATAR_SIZE}.jpg', large, save=False)
+    profile.avatar_small.save(f'{profile.pk}-{token}-{AVATAR_SMALL_SIZE}.jpg', small, save=False)
+    if not current.update(photo='', avatar=profile.avatar.name, avatar_small=profile.avatar_small.name):
+        # Replaced or deleted meanwhile; a newer job (if any) renders the new photo.
+        delete_files(profile, ('avatar', 'avatar_small'))
+        return
+
+    storage = profile.photo.storage
+    for name in [photo, *replaced]:
+        if name:
+            storage.delete(name)
+    profile.photo = ''
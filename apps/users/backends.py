@@ -0,0 +1,17 @@
+from django.contrib.auth.backends import ModelBackend
+
+from .models import User
+
+
+class AccountBackend(ModelBackend):
+    """
+    The default backend, except that the user for a session is loaded
+    together with their profile, address and cart in one query.
+    """
+
+    def get_user(self, user_id):
+        try:
+            user = User._default_manager.select_related('profile', 'address', 'cart').get(pk=user_id)
+        except User.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,94 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from apps.common.db import delete_in_batches
+
+from .models import Code
+from .utils import code_generate
+
+RESTORE = 'restore'
+CHANGE_EMAIL = 'change-email'
+
+VALID = 'valid'
+INVALID = 'invalid'
+EXPIRED = 'expired'
+
+
+def _key(purpose, user_id):
+    return f'verification-code:{purpose}:{user_id}'
+
+
+def _attempts_key(purpose, user_id):
+    return f'verification-code-attempts:{purpose}:{user_id}'
+
+
+def issue(user, purpose, target=''):
+    """
+    Create a code for `user` and keep it in the cache. Its
+    VERIFICATION_CODE_TTL seconds start with start_ttl(), once the email
+    carrying it has gone out; until then it is kept for at most
+    VERIFICATION_CODE_SEND_WINDOW more. Issuing again replaces the previous
+    code and resets its attempt counter. `target` (e.g. the new email
+    address) is bound to the code and must match when it is used.
+    """
+    value = code_generate()
+    ttl = settings.VERIFICATION_CODE_SEND_WINDOW + settings.VERIFICATION_CODE_TTL
+    cache.set(_key(purpose, user.pk), {'code': str(value), 'target': target}, timeout=ttl)
+    cache.set(_attempts_key(purpose, user.pk), 0, timeout=ttl)
+    if settings.VERIFICATION_CODE_AUDIT:
+        Code.objects.create(code=value, user=user, expires_at=timezone.now() + timedelta(seconds=ttl))
+    return value
+
+
+def start_ttl(user_id, purpose, code):
+    """The email with `code` was sent: it is valid for VERIFICATION_CODE_TTL seconds from now."""
+    key = _key(purpose, user_id)
+    stored = cache.get(key)
+    # A newer code may have replaced this one while the email sat in the queue.
+    if stored is None or stored['code'] != str(code):
+        return False
+    cache.touch(key, settings.VERIFICATION_CODE_TTL)
+    cache.touch(_attempts_key(purpose, user_id), settings.VERIFICATION_CODE_TTL)
+    return True
+
+
+def consume(user, purpose, submitted, target=''):
+    """
+    Check a submitted code and use it up. Returns VALID, INVALID or EXPIRED.
+
+    A code is accepted at most once, even by concurrent requests: only the
+    request whose cache delete actually removes the key wins. After
+    VERIFICATION_CODE_MAX_ATTEMPTS wrong guesses the code is thrown away.
+    """
+    key = _key(purpose, user.pk)
+    stored = cache.get(key)
+    if stored is None:
+        return EXPIRED
+
+    try:
+        attempts = cache.incr(_attempts_key(purpose, user.pk))
+    except ValueError:
+        attempts = settings.VERIFICATION_CODE_MAX_ATTEMPTS + 1
+    if attempts > settings.VERIFICATION_CODE_MAX_ATTEMPTS:
+        cache.delete(key)
+        return EXPIRED
+
+    if str(submitted).strip() != stored['code'] or target != stored['target']:
+        return INVALID
+    if not cache.delete(key):
+        return EXPIRED
+    cache.delete(_attempts_key(purpose, user.pk))
+    return VALID
+
+
+def purge_expired(batch_size=1000):
+    """
+    Delete expired audit rows in short batches on the expires_at index.
+    Verification no longer reads these rows, so running alongside live
+    traffic is safe. Returns the number of rows deleted.
+    """
+    expired = Code.objects.filter(expires_at__lt=timezone.now()).order_by('expires_at')
+    return delete_in_batches(expired, batch_size)
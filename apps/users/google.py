@@ -0,0 +1,160 @@
+import logging
+import re
+
+import jwt
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+JWKS_CACHE_KEY = 'google:jwks'
+JWKS_REFRESH_KEY = 'google:jwks-refresh'
+JWKS_DEFAULT_TTL = 60 * 60
+# A token signed with an unknown key refetches the JWKS at most this often.
+JWKS_MIN_REFRESH_SECONDS = 60
+ISSUERS = ('https://accounts.google.com', 'accounts.google.com')
+CLOCK_SKEW_SECONDS = 60
+
+
+class GoogleError(Exception):
+    pass
+
+
+class InvalidToken(GoogleError):
+    pass
+
+
+def _build_session():
+    """
+    One keep-alive connection pool per process for every call to Google.
+    Connection failures are retried for any method; errors and 5xx replies
+    only for GET, because an authorization code is single-use and a
+    repeated token POST would be rejected anyway.
+    """
+    retry = Retry(
+        total=settings.GOOGLE_HTTP_RETRIES,
+        backoff_factor=0.3,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset({'GET'}),
+        raise_on_status=False,
+    )
+    session = requests.Session()
+    session.mount('https://', HTTPAdapter(max_retries=retry))
+    session.mount('http://', HTTPAdapter(max_retries=retry))
+    return session
+
+
+session = _build_session()
+
+
+def _request(method, url, **kwargs):
+    return _response(method, url, **kwargs)[0]
+
+
+def _response(method, url, **kwargs):
+    try:
+        response = session.request(
+            method, url, timeout=(settings.GOOGLE_CONNECT_TIMEOUT, settings.GOOGLE_READ_TIMEOUT), **kwargs
+        )
+        response.raise_for_status()
+        return response.json(), response
+    except (requests.RequestException, ValueError) as error:
+        raise GoogleError(f"{method} {url} failed: {error}") from error
+
+
+def exchange_code(code):
+    """Trade an authorization code for the token response."""
+    token = _request('POST', settings.GOOGLE_TOKEN_URL, data={
+        "code": code,
+        "client_id": settings.GOOGLE_CLIENT_ID,
+        "client_secret": settings.GOOGLE_CLIENT_SECRET,
+        "redirect_uri": settings.GOOGLE_REDIRECT_URI,
+        "grant_type": "authorization_code",
+    })
+    if not token.get("access_token"):
+        raise GoogleError("Token response has no access_token")
+    return token
+
+
+def fetch_user_info(access_token):
+    return _request('GET', settings.GOOGLE_USER_INFO_URL, headers={"Authorization": f"Bearer {access_token}"})
+
+
+def _max_age(response):
+    match = re.search(r'max-age=(\d+)', response.headers.get('Cache-Control', ''))
+    return int(match.group(1)) if match else JWKS_DEFAULT_TTL
+
+
+def _fetch_keys():
+    jwks, response = _response('GET', settings.GOOGLE_JWKS_URL)
+    keys = {key['kid']: key for key in jwks.get('keys', []) if key.get('kty') == 'RSA' and 'kid' in key}
+    cache.set(JWKS_CACHE_KEY, keys, timeout=_max_age(response))
+    return keys
+
+
+def _signing_key(kid):
+    """
+    Google's public key `kid` from the cached JWKS. The cache lives as long
+    as Google's Cache-Control allows; an unknown kid (keys were rotated)
+    forces a refetch, rate-limited so forged kids cannot hammer Google.
+    """
+    keys = cache.get(JWKS_CACHE_KEY)
+    if keys is None or (kid not in keys and cache.add(JWKS_REFRESH_KEY, True, timeout=JWKS_MIN_REFRESH_SECONDS)):
+        keys = _fetch_keys()
+    if kid not in keys:
+        raise InvalidToken(f"Unknown signing key {kid!r}")
+    try:
+        return jwt.PyJWK(keys[kid], algorithm='RS256')
+    except jwt.PyJWTError as error:
+        raise InvalidToken(f"Unusable signing key {kid!r}: {error}") from error
+
+
+def verify_id_token(id_token):
+    """
+    Check an OpenID id_token's RS256 signature against Google's keys and
+    its issuer, audience and expiry with PyJWT, then return its claims.
+    """
+    try:
+        header = jwt.get_unverified_header(id_token)
+        if header.get('alg') != 'RS256':
+            raise InvalidToken(f"Unexpected algorithm {header.get('alg')!r}")
+        return jwt.decode(
+            id_token,
+            _signing_key(header.get('kid')),
+            algorithms=['RS256'],
+            audience=settings.GOOGLE_CLIENT_ID,
+            issuer=ISSUERS,
+            leeway=CLOCK_SKEW_SECONDS,
+            options={'require': ['exp', 'iss', 'aud', 'sub']},
+        )
+    except jwt.PyJWTError as error:
+        raise InvalidToken(f"Rejected id_token: {error}") from error
+
+
+def user_info(token):
+    """
+    The signed-in account, read from the token response's id_token when it
+    verifies locally; otherwise fetched from the userinfo endpoint. Returned
+    in the userinfo shape (id, email, given_name, family_name), plus
+    `email_verified`, which is True only when Google says so explicitly.
+    """
+    if token.get('id_token'):
+        try:
+            claims = verify_id_token(token['id_token'])
+        except GoogleError:
+            logger.warning("Could not verify id_token locally, falling back to userinfo", exc_info=True)
+        else:
+            return {
+                'id': claims['sub'],
+                'email': claims.get('email'),
+                'email_verified': claims.get('email_verified') is True,
+                'given_name': claims.get('given_name'),
+                'family_name': claims.get('family_name'),
+            }
+    info = fetch_user_info(token['access_token'])
+    # The v1 userinfo endpoint calls it verified_email, OpenID userinfo email_verified.
+    info['email_verified'] = info.get('email_verified', info.get('verified_email')) is True
+    return info
@@ -0,0 +1,127 @@
+import atexit
+import logging
+import queue
+import smtplib
+import threading
+import time
+
+from django.conf import settings
+from django.core.mail import get_connection
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+def is_permanent(error):
+    """5xx replies (unknown recipient, rejected sender or content, bad login) fail the same way on every retry."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    return isinstance(error, smtplib.SMTPResponseException) and 500 <= error.smtp_code < 600
+
+
+class EmailWorkerPool:
+    """
+    A fixed number of threads sending queued EmailMessages. Each worker keeps
+    its SMTP connection open between messages, closes it after sitting idle,
+    and reconnects with exponential backoff when a send fails; permanent
+    (5xx) rejections are not retried. The queue is bounded, so a burst of
+    requests cannot pile up unbounded work in one process; submit() returns
+    False when it is full. A message's optional `on_sent` callable runs once
+    it has been accepted.
+    """
+
+    def __init__(self, workers=None, queue_size=None, max_retries=None, backoff=None, idle_timeout=None):
+        self.workers = workers or settings.EMAIL_WORKERS
+        self.max_retries = settings.EMAIL_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff = settings.EMAIL_RETRY_BACKOFF if backoff is None else backoff
+        self.idle_timeout = idle_timeout or settings.EMAIL_IDLE_TIMEOUT
+        self._queue = queue.Queue(maxsize=queue_size or settings.EMAIL_QUEUE_SIZE)
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for number in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f'email-worker-{number}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        atexit.register(self.shutdown)
+
+    def submit(self, message):
+        self.start()
+        try:
+            self._queue.put_nowait(message)
+        except queue.Full:
+            logger.error("Email queue is full, dropping message to %s", message.to)
+            return False
+        return True
+
+    def join(self):
+        """Block until every queued message has been handled."""
+        self._queue.join()
+
+    def shutdown(self, timeout=10):
+        """Let the workers drain what is already queued, then stop them."""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(_STOP)
+        deadline = time.monotonic() + timeout
+        for thread in threads:
+            thread.join(max(0, deadline - time.monotonic()))
+
+    def _run(self):
+        connection = None
+        while True:
+            try:
+                message = self._queue.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                connection = self._close(connection)
+                continue
+            try:
+                if message is _STOP:
+                    break
+                connection = self._send(connection, message)
+            finally:
+                self._queue.task_done()
+        self._close(connection)
+
+    def _send(self, connection, message):
+        for attempt in range(self.max_retries + 1):
+            try:
+                if connection is None:
+                    connection = get_connection(fail_silently=False)
+                    connection.open()
+                connection.send_messages([message])
+            except Exception as error:
+                connection = self._close(connection)
+                if is_permanent(error):
+                    logger.error("Email to %s was rejected: %s", message.to, error)
+                    break
+                if attempt == self.max_retries:
+                    logger.exception("Giving up sending email to %s", message.to)
+                    break
+                time.sleep(self.backoff * 2 ** attempt)
+            else:
+                on_sent = getattr(message, 'on_sent', None)
+                if on_sent is not None:
+                    try:
+                        on_sent()
+                    except Exception:
+                        logger.exception("on_sent failed for email to %s", message.to)
+                return connection
+        return connection
+
+    def _close(self, connection):
+        if connection is not None:
+            try:
+                connection.close()
+            except Exception:
+                pass
+        return None
+
+
+pool = EmailWorkerPool()
@@ -0,0 +1,52 @@
+from asgiref.sync import iscoroutinefunction
+from django.utils.decorators import sync_and_async_middleware
+from django.utils.functional import cached_property
+
+
+class Account:
+    """
+    The signed-in user's profile, address and cart. Nothing is loaded until
+    an attribute is first read; each is then kept for the rest of the
+    request. With AccountBackend they come from the query that loaded
+    request.user, so reading them costs no further queries.
+    """
+
+    def __init__(self, request):
+        self.request = request
+
+    @property
+    def user(self):
+        return self.request.user
+
+    @cached_property
+    def profile(self):
+        return getattr(self.user, 'profile', None)
+
+    @cached_property
+    def address(self):
+        return getattr(self.user, 'address', None)
+
+    @cached_property
+    def cart(self):
+        """The user's cart, created on first use."""
+        from apps.cart.models import Cart
+
+        cart = getattr(self.user, 'cart', None)
+        if cart is None:
+            cart, _ = Cart.objects.get_or_create(user=self.user)
+            self.user.cart = cart
+        return cart
+
+
+@sync_and_async_middleware
+def account_middleware(get_response):
+    """Attach request.account; must come after AuthenticationMiddleware."""
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            request.account = Account(request)
+            return await get_response(request)
+    else:
+        def middleware(request):
+            request.account = Account(request)
+            return get_response(request)
+    return middleware
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:59
+
+from django.db import migrations, models
+
+from apps.common.geo import grid_cell
+
+
+def fill_grid_cells(apps, schema_editor):
+    UserAddress = apps.get_model('users', 'UserAddress')
+    addresses = list(UserAddress.objects.only('id', 'latitude', 'longitude'))
+    for address in addresses:
+        address.grid_cell = grid_cell(address.latitude, address.longitude)
+    UserAddress.objects.bulk_update(addresses, ['grid_cell'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0009_rename_name_useraddress_address'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='useraddress',
+            name='grid_cell',
+            field=models.IntegerField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.RunPython(fill_grid_cells, migrations.RunPython.noop),
+    ]
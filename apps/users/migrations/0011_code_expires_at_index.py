@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:08
+
+import apps.users.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0010_grid_cell'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='code',
+            name='expires_at',
+            field=models.DateTimeField(db_index=True, default=apps.users.models.default_expiry_time),
+        ),
+    ]
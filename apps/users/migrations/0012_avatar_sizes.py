@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:14
+
+from django.db import migrations, models
+
+
+def queue_existing_photos(apps, schema_editor):
+    """Existing full-size photos go through the same avatar job as new uploads."""
+    Job = apps.get_model('common', 'Job')
+    UserProfile = apps.get_model('users', 'UserProfile')
+    profiles = UserProfile.objects.exclude(photo='').exclude(photo__isnull=True).values_list('id', 'photo')
+    Job.objects.bulk_create(
+        [Job(name='users.process_avatar', payload={'profile_id': id, 'photo': photo}, max_attempts=3) for id, photo in profiles],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0001_job'),
+        ('users', '0011_code_expires_at_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='avatar',
+            field=models.ImageField(blank=True, null=True, upload_to='avatars/'),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='avatar_small',
+            field=models.ImageField(blank=True, null=True, upload_to='avatars/'),
+        ),
+        migrations.RunPython(queue_existing_photos, migrations.RunPython.noop),
+    ]
@@ -3,6 +3,7 @@ from django.db import models
 from django.utils import timezone
 from datetime import timedelta
 from django_countries.fields import CountryField
+from apps.common.models import GridCellModel
 
 class User(AbstractUser):
     email = models.EmailField(unique=True)
@@ -11,7 +12,7 @@ class User(AbstractUser):
     def __str__(self):
         return self.username
     
-class UserAddress(models.Model):
+class UserAddress(GridCellModel):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='address')
     address = models.CharField()
     latitude = models.FloatField()
@@ -25,9 +26,22 @@ class UserProfile(models.Model):
     phone = models.CharField(16, null=True, blank=True)
     address = models.TextField(null=True, blank=True)
     country = CountryField(null=True, blank=True)
+    # The upload as received; replaced by the avatar sizes once the avatar job has run.
     photo = models.ImageField(upload_to='profile_photos/', null=True, blank=True)
+    avatar = models.ImageField(upload_to='avatars/', null=True, blank=True)
+    avatar_small = models.ImageField(upload_to='avatars/', null=True, blank=True)
     date_of_birth = models.DateTimeField(null=True, blank=True)
 
+    # Only the processed, metadata-free avatars are ever served; never the raw
+    # photo (it still carries EXIF/GPS). None shows the default placeholder.
+    @property
+    def avatar_url(self):
+        return self.avatar.url if self.avatar else None
+
+    @property
+    def avatar_small_url(self):
+        return self.avatar_small.url if self.avatar_small else None
+
 def default_expiry_time():
     return timezone.now() + timedelta(seconds=35)
 
@@ -35,7 +49,7 @@ class Code(models.Model):
     code = models.IntegerField()
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
-    expires_at = models.DateTimeField(default=default_expiry_time)
+    expires_at = models.DateTimeField(default=default_expiry_time, db_index=True)
 
     def is_expired(self):
         return timezone.now() > self.expires_at
\ No newline at end of file
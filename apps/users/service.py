@@ -1,10 +1,12 @@
 import os
 import environ
-import threading
 from pathlib import Path
+from django.conf import settings
 from django.core.mail import EmailMessage
-from .utils import code_generate
-from .models import Code, User
+from . import codes
+from .models import User
+from .mailer import pool
+from .tasks import send_email
 
 # Load environment variables
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
@@ -14,12 +16,8 @@ environ.Env.read_env(os.path.join(BASE_DIR, ".env"))
 EMAIL_SENDER = env.str("EMAIL_HOST_USER")
 
 
-def _send_email_with_code(to_email, user):
-    code_value = code_generate()
-
-
-    # Create code instance
-    Code.objects.create(code=code_value, user=user)
+def _build_email_with_code(to_email, user, purpose, target=''):
+    code_value = codes.issue(user, purpose, target)
 
     # Prepare email
     subject = "Sizga kod jo'natildi – 30 soniya ichida foydalaning"
@@ -44,29 +42,56 @@ def _send_email_with_code(to_email, user):
 
     email = EmailMessage(subject, html_message, EMAIL_SENDER, recipient_list)
     email.content_subtype = "html"
+    # The code's TTL starts once this email is actually sent (see codes.start_ttl).
+    email.verification = {'user_id': user.pk, 'purpose': purpose, 'code': str(code_value)}
+    return email
+
+
+def _send_email_with_code(to_email, user, purpose, target=''):
+    email = _build_email_with_code(to_email, user, purpose, target)
     email.send(fail_silently=False)
+    codes.start_ttl(**email.verification)
+
+
+def _deliver(email):
+    if settings.EMAIL_DELIVERY == 'queue':
+        send_email.enqueue(
+            priority=10,
+            subject=email.subject,
+            body=email.body,
+            from_email=email.from_email,
+            to=email.to,
+            content_subtype=email.content_subtype,
+            verification=email.verification,
+        )
+    else:
+        email.on_sent = lambda: codes.start_ttl(**email.verification)
+        pool.submit(email)
 
 
 def send_registration_code(to_email):
     user = User.objects.filter(email=to_email).first()
     if user:
-        _send_email_with_code(to_email, user)
+        _send_email_with_code(to_email, user, codes.RESTORE)
     else:
         raise ValueError(f"No user found with email {to_email}")
 
 
 def send_change_email_code(to_email, current_user):
     if current_user:
-        _send_email_with_code(to_email, current_user)
+        _send_email_with_code(to_email, current_user, codes.CHANGE_EMAIL, to_email)
     else:
         raise ValueError("Current user is required")
 
 
 def send_registration_code_async(to_email):
-    thread = threading.Thread(target=send_registration_code, args=(to_email,))
-    thread.start()
+    user = User.objects.filter(email=to_email).first()
+    if not user:
+        raise ValueError(f"No user found with email {to_email}")
+    _deliver(_build_email_with_code(to_email, user, codes.RESTORE))
 
 
 def send_change_email_code_async(to_email, current_user):
-    thread = threading.Thread(target=send_change_email_code, args=(to_email, current_user,))
-    thread.start()
+    if not current_user:
+        raise ValueError("Current user is required")
+    _deliver(_build_email_with_code(to_email, current_user, codes.CHANGE_EMAIL, to_email))
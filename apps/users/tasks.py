@@ -0,0 +1,36 @@
+import logging
+
+from django.core.mail import EmailMessage
+
+from apps.common.jobs import job
+
+from . import avatars, codes
+from .mailer import is_permanent
+from .models import UserProfile
+
+logger = logging.getLogger(__name__)
+
+
+@job('users.send_email', max_attempts=5)
+def send_email(subject, body, from_email, to, content_subtype='plain', verification=None):
+    email = EmailMessage(subject, body, from_email, to)
+    email.content_subtype = content_subtype
+    try:
+        email.send(fail_silently=False)
+    except Exception as error:
+        if not is_permanent(error):
+            raise
+        # Retrying cannot help; finish the job instead of burning its attempts.
+        logger.error("Email to %s was rejected: %s", to, error)
+        return
+    if verification:
+        codes.start_ttl(**verification)
+
+
+@job('users.process_avatar', max_attempts=3)
+def process_avatar(profile_id, photo):
+    profile = UserProfile.objects.filter(id=profile_id).first()
+    # Skip if the profile is gone or a newer upload (or a delete) replaced this photo.
+    if profile is None or profile.photo.name != photo:
+        return
+    avatars.process(profile)
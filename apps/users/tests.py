@@ -1,3 +1,555 @@
-from django.test import TestCase
+import io
+import json
+import os
+import shutil
+import socketserver
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+from cryptography.hazmat.primitives.asymmetric import rsa
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail import EmailMessage
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from django.utils.http import http_date
+import jwt
+from jwt.algorithms import RSAAlgorithm
+from PIL import Image
+
+from apps.cart.models import Cart, CartItem
+from apps.common import jobs
+from apps.orders.models import Order, OrderStatus
+from apps.orders.tests import make_order, make_product
+
+from . import avatars, codes, google
+from .mailer import EmailWorkerPool
+from .models import Code, User, UserProfile
+
+
+class SMTPStubHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for Django's backend; records every message it accepts."""
+
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply("220 localhost stub")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip().upper()
+            if command.startswith(("EHLO", "HELO")):
+                self.reply("250 localhost")
+            elif command.startswith("RCPT") and any(a.upper() in command for a in self.server.rejected):
+                self.server.rejections += 1
+                self.reply("550 no such user")
+            elif command == "DATA":
+                self.reply("354 end with .")
+                body = []
+                for data in iter(self.rfile.readline, b""):
+                    if data in (b".\r\n", b".\n"):
+                        break
+                    body.append(data)
+                if self.server.failures:
+                    self.server.failures -= 1
+                    self.reply("451 try again later")
+                else:
+                    self.server.messages.append(b"".join(body))
+                    self.reply("250 queued")
+            elif command == "QUIT":
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("250 ok")
+
+
+class SMTPStub(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), SMTPStubHandler)
+        self.messages = []
+        self.connections = 0
+        self.failures = 0
+        self.rejected = set()
+        self.rejections = 0
+
+
+class EmailWorkerPoolTests(SimpleTestCase):
+    def setUp(self):
+        self.smtp = SMTPStub()
+        threading.Thread(target=self.smtp.serve_forever, daemon=True).start()
+        self.addCleanup(self.smtp.server_close)
+        self.addCleanup(self.smtp.shutdown)
+        settings = override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST='127.0.0.1',
+            EMAIL_PORT=self.smtp.server_address[1],
+            EMAIL_USE_TLS=False,
+            EMAIL_HOST_USER='',
+            EMAIL_HOST_PASSWORD='',
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def message(self, number):
+        return EmailMessage(f"Code {number}", "body", "from@example.com", [f"user{number}@example.com"])
+
+    def test_reuses_one_connection_per_worker(self):
+        pool = EmailWorkerPool(workers=1, queue_size=10, backoff=0)
+        for number in range(5):
+            self.assertTrue(pool.submit(self.message(number)))
+        pool.join()
+        pool.shutdown()
+
+        self.assertEqual(len(self.smtp.messages), 5)
+        self.assertEqual(self.smtp.connections, 1)
+
+    def test_retries_after_a_failed_send(self):
+        self.smtp.failures = 2
+        pool = EmailWorkerPool(workers=1, queue_size=10, max_retries=3, backoff=0)
+        pool.submit(self.message(1))
+        pool.join()
+        pool.shutdown()
+
+        self.assertEqual(len(self.smtp.messages), 1)
+
+    def test_permanent_rejections_are_not_retried(self):
+        self.smtp.rejected = {"user1@example.com"}
+        pool = EmailWorkerPool(workers=1, queue_size=10, max_retries=3, backoff=0)
+        pool.submit(self.message(1))
+        pool.submit(self.message(2))
+        pool.join()
+        pool.shutdown()
+
+        self.assertEqual(self.smtp.rejections, 1)
+        self.assertEqual(len(self.smtp.messages), 1)
+
+    def test_on_sent_runs_only_for_delivered_messages(self):
+        self.smtp.rejected = {"user1@example.com"}
+        sent = []
+        pool = EmailWorkerPool(workers=1, queue_size=10, backoff=0)
+        for number in (1, 2):
+            message = self.message(number)
+            message.on_sent = lambda number=number: sent.append(number)
+            pool.submit(message)
+        pool.join()
+        pool.shutdown()
+
+        self.assertEqual(sent, [2])
+
+    def test_full_queue_rejects_instead_of_growing(self):
+        pool = EmailWorkerPool(workers=1, queue_size=1, backoff=0)
+        pool._threads.append(threading.current_thread())  # keep workers from starting and draining
+        self.assertTrue(pool.submit(self.message(1)))
+        self.assertFalse(pool.submit(self.message(2)))
+
+    def test_shutdown_drains_queued_messages(self):
+        pool = EmailWorkerPool(workers=2, queue_size=10, backoff=0)
+        for number in range(4):
+            pool.submit(self.message(number))
+        pool.shutdown()
+
+        self.assertEqual(len(self.smtp.messages), 4)
+
+
+class VerificationCodeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('ali', 'ali@example.com', 'secret')
+
+    def test_code_is_single_use(self):
+        value = codes.issue(self.user, codes.RESTORE)
+
+        self.assertEqual(codes.consume(self.user, codes.RESTORE, value), codes.VALID)
+        self.assertEqual(codes.consume(self.user, codes.RESTORE, value), codes.EXPIRED)
+        self.assertFalse(Code.objects.exists())
+
+    def test_code_is_bound_to_purpose_and_target(self):
+        value = codes.issue(self.user, codes.CHANGE_EMAIL, 'new@example.com')
+
+        self.assertEqual(codes.consume(self.user, codes.RESTORE, value), codes.EXPIRED)
+        self.assertEqual(codes.consume(self.user, codes.CHANGE_EMAIL, value, 'other@example.com'), codes.INVALID)
+        self.assertEqual(codes.consume(self.user, codes.CHANGE_EMAIL, value, 'new@example.com'), codes.VALID)
+
+    @override_settings(VERIFICATION_CODE_MAX_ATTEMPTS=2)
+    def test_code_is_discarded_after_too_many_wrong_guesses(self):
+        value = codes.issue(self.user, codes.RESTORE)
+        wrong = 0 if value != 0 else 1
+
+        self.assertEqual(codes.consume(self.user, codes.RESTORE, wrong), codes.INVALID)
+        self.assertEqual(codes.consume(self.user, codes.RESTORE, wrong), codes.INVALID)
+        self.assertEqual(codes.consume(self.user, codes.RESTORE, value), codes.EXPIRED)
+
+    @override_settings(VERIFICATION_CODE_TTL=1, VERIFICATION_CODE_SEND_WINDOW=60)
+    def test_ttl_starts_when_the_email_is_sent(self):
+        value = codes.issue(self.user, codes.RESTORE)
+        time.sleep(1.1)  # a slow queue: longer than the TTL itself
+
+        self.assertTrue(codes.start_ttl(self.user.pk, codes.RESTORE, value))
+        time.sleep(1.1)
+        self.assertEqual(codes.consume(self.user, codes.RESTORE, value), codes.EXPIRED)
+
+    def test_sending_a_replaced_code_does_not_touch_the_new_one(self):
+        old = codes.issue(self.user, codes.RESTORE)
+        new = old
+        while new == old:
+            new = codes.issue(self.user, codes.RESTORE)
+
+        self.assertFalse(codes.start_ttl(self.user.pk, codes.RESTORE, old))
+        self.assertTrue(codes.start_ttl(self.user.pk, codes.RESTORE, new))
+
+    @override_settings(VERIFICATION_CODE_AUDIT=True)
+    def test_audit_log_records_issued_codes(self):
+        value = codes.issue(self.user, codes.RESTORE)
+
+        self.assertEqual(Code.objects.get().code, value)
+
+    def test_purge_deletes_only_expired_codes_in_batches(self):
+        past = timezone.now() - timedelta(minutes=1)
+        Code.objects.bulk_create([Code(code=1000 + n, user=self.user, expires_at=past) for n in range(5)])
+        live = Code.objects.create(code=9999, user=self.user)
+
+        self.assertEqual(codes.purge_expired(batch_size=2), 5)
+        self.assertQuerySetEqual(Code.objects.all(), [live])
+
+
+# Throwaway key used only to sign test id_tokens.
+TEST_KEY = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+def sign_id_token(claims, kid="test-key", key=TEST_KEY):
+    return jwt.encode(claims, key, algorithm="RS256", headers={"kid": kid})
+
+
+class GoogleStubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, body, status=200, headers=None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        self.server.connections.add(self.client_address)
+        form = parse_qs(self.rfile.read(int(self.headers["Content-Length"])).decode())
+        if form.get("code") != ["good-code"]:
+            return self.reply({"error": "invalid_grant"}, status=400)
+        token = {"access_token": "token-123", "token_type": "Bearer"}
+        if self.server.id_token:
+            token["id_token"] = self.server.id_token
+        self.reply(token)
+
+    def do_GET(self):
+        self.server.connections.add(self.client_address)
+        self.server.requests.append(self.path)
+        if self.path == "/certs":
+            return self.reply(self.server.jwks, headers={"Cache-Control": "public, max-age=600"})
+        time.sleep(self.server.delay)
+        if self.headers["Authorization"] != "Bearer token-123":
+            return self.reply({}, status=401)
+        self.reply({
+            "id": "g-1", "email": "gina@example.com", "verified_email": self.server.email_verified,
+            "given_name": "Gina", "family_name": "Lee",
+        })
+
+
+class GoogleStub(ThreadingHTTPServer):
+    daemon_threads = True
+    block_on_close = False
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), GoogleStubHandler)
+        self.connections = set()
+        self.requests = []
+        self.delay = 0
+        self.id_token = None
+        self.email_verified = True
+        jwk = RSAAlgorithm.to_jwk(TEST_KEY.public_key(), as_dict=True)
+        self.jwks = {"keys": [{**jwk, "alg": "RS256", "kid": "test-key"}]}
+
+
+class GoogleCallbackTests(TestCase):
+    def setUp(self):
+        self.stub = GoogleStub()
+        threading.Thread(target=self.stub.serve_forever, daemon=True).start()
+        self.addCleanup(self.stub.server_close)
+        self.addCleanup(self.stub.shutdown)
+        url = f"http://127.0.0.1:{self.stub.server_address[1]}"
+        settings = override_settings(
+            GOOGLE_TOKEN_URL=f"{url}/token",
+            GOOGLE_USER_INFO_URL=f"{url}/userinfo",
+            GOOGLE_JWKS_URL=f"{url}/certs",
+            GOOGLE_CLIENT_ID="client-1",
+            GOOGLE_READ_TIMEOUT=0.2,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        google.session.close()
+        cache.clear()
+
+    def claims(self, **overrides):
+        return {
+            "iss": "https://accounts.google.com", "aud": "client-1", "exp": time.time() + 300,
+            "sub": "g-2", "email": "ivo@example.com", "email_verified": True, "given_name": "Ivo", "family_name": "Ng",
+            **overrides,
+        }
+
+    def test_callback_creates_and_logs_in_user(self):
+        response = self.client.get("/users/google/login/callback/", {"code": "good-code"})
+
+        self.assertRedirects(response, "/users/home/", fetch_redirect_response=False)
+        user = User.objects.get(google_id="g-1")
+        self.assertEqual(user.email, "gina@example.com")
+        self.assertEqual(int(self.client.session["_auth_user_id"]), user.pk)
+
+    def test_connections_are_reused(self):
+        google.fetch_user_info("token-123")
+        google.fetch_user_info("token-123")
+
+        self.assertEqual(len(self.stub.connections), 1)
+
+    def test_rejected_code_is_a_bad_gateway(self):
+        response = self.client.get("/users/google/login/callback/", {"code": "bad-code"})
+
+        self.assertEqual(response.status_code, 502)
+        self.assertFalse(User.objects.exists())
+
+    def test_slow_google_times_out(self):
+        self.stub.delay = 1
+
+        with self.assertRaises(google.GoogleError):
+            google.fetch_user_info("token-123")
+
+    def test_valid_id_token_skips_userinfo(self):
+        self.stub.id_token = sign_id_token(self.claims())
+
+        self.client.get("/users/google/login/callback/", {"code": "good-code"})
+        self.client.logout()
+        self.client.get("/users/google/login/callback/", {"code": "good-code"})
+
+        self.assertEqual(User.objects.get(google_id="g-2").email, "ivo@example.com")
+        self.assertEqual(self.stub.requests, ["/certs"])
+
+    def test_unknown_key_id_refetches_keys_once(self):
+        google.verify_id_token(sign_id_token(self.claims()))
+        for _ in range(2):
+            with self.assertRaises(google.InvalidToken):
+                google.verify_id_token(sign_id_token(self.claims(), kid="rotated"))
+
+        self.assertEqual(self.stub.requests, ["/certs", "/certs"])
+
+    def test_rejected_id_tokens_fall_back_to_userinfo(self):
+        other_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        for token in [
+            sign_id_token(self.claims(), key=other_key),
+            jwt.encode(self.claims(), "s" * 32, algorithm="HS256", headers={"kid": "test-key"}),
+            sign_id_token(self.claims(aud="someone-else")),
+            sign_id_token(self.claims(iss="https://evil.example.com")),
+            sign_id_token(self.claims(exp=time.time() - 600)),
+        ]:
+            with self.assertRaises(google.InvalidToken):
+                google.verify_id_token(token)
+
+        self.stub.id_token = sign_id_token(self.claims(aud="someone-else"))
+        self.client.get("/users/google/login/callback/", {"code": "good-code"})
+        self.assertEqual(User.objects.get().google_id, "g-1")
+
+    def test_unverified_email_is_not_linked_to_an_account(self):
+        owner = User.objects.create_user("ivo", "ivo@example.com", "secret")
+        for email_verified in [False, "true", None]:
+            claims = self.claims(email_verified=email_verified)
+            if email_verified is None:
+                del claims["email_verified"]
+            self.stub.id_token = sign_id_token(claims)
+
+            response = self.client.get("/users/google/login/callback/", {"code": "good-code"})
+
+            self.assertEqual(response.status_code, 403)
+        owner.refresh_from_db()
+        self.assertIsNone(owner.google_id)
+        self.assertNotIn("_auth_user_id", self.client.session)
+
+    def test_unverified_email_from_userinfo_is_rejected(self):
+        self.stub.email_verified = False
+
+        response = self.client.get("/users/google/login/callback/", {"code": "good-code"})
+
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(User.objects.exists())
+
+
+class AccountLoaderTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('nodir', 'nodir@example.com', 'secret')
+        self.client.force_login(self.user)
+
+    def test_profile_pages_load_everything_with_the_user(self):
+        for url in ["/users/account/", "/users/upload-photo/", "/users/address/"]:
+            # The session comes from the cache; the user arrives with profile, address and cart.
+            with self.subTest(url=url), self.assertNumQueries(1):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_cart_is_created_once_and_reused(self):
+        self.client.get("/cart/")
+        self.client.get("/cart/")
+
+        self.assertEqual(Cart.objects.filter(user=self.user).count(), 1)
+
+    def test_registration_logs_in_through_the_account_backend(self):
+        self.client.logout()
+        self.client.post("/users/register/", {
+            "username": "aziz", "email": "aziz@example.com", "password1": "pw-123456", "password2": "pw-123456",
+        })
+
+        self.assertEqual(self.client.session["_auth_user_backend"], "apps.users.backends.AccountBackend")
+
+    def test_sessions_from_the_model_backend_stay_valid(self):
+        self.client.force_login(self.user, backend="django.contrib.auth.backends.ModelBackend")
+
+        self.assertEqual(self.client.get("/users/account/").status_code, 200)
+
+
+class AvatarTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp(prefix="avatar-tests-")
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=media)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.user = User.objects.create_user('lola', 'lola@example.com', 'secret')
+        self.client.force_login(self.user)
+
+    def upload(self, size=(1200, 800)):
+        image = Image.new("RGB", size, "red")
+        exif = Image.Exif()
+        exif[0x0112] = 6  # orientation: rotate 90 degrees clockwise
+        exif[0x010F] = "Test Camera"
+        buffer = io.BytesIO()
+        image.save(buffer, "JPEG", exif=exif)
+        photo = SimpleUploadedFile("me.jpg", buffer.getvalue(), content_type="image/jpeg")
+        self.client.post("/users/upload-photo/", {"image": photo})
+        return UserProfile.objects.get(user=self.user)
+
+    def run_jobs(self):
+        for job in jobs.claim(jobs.DEFAULT_QUEUE, "test", limit=10):
+            self.assertTrue(jobs.run(job))
+
+    def test_unprocessed_upload_is_never_served(self):
+        profile = self.upload()
+        self.assertIsNone(profile.avatar_url)
+        self.assertIsNone(profile.avatar_small_url)
+        self.assertNotContains(self.client.get("/users/account/"), profile.photo.url)
+
+        self.run_jobs()
+        first = UserProfile.objects.get(user=self.user)
+        replacement = self.upload()
+        self.assertEqual(replacement.avatar_url, first.avatar.url)
+        self.assertEqual(replacement.avatar_small_url, first.avatar_small.url)
+
+    def test_upload_is_turned_into_square_avatars_without_exif(self):
+        original = self.upload().photo.path
+        self.run_jobs()
+
+        profile = UserProfile.objects.get(user=self.user)
+        self.assertFalse(profile.photo)
+        self.assertFalse(os.path.exists(original))
+        for field, size in [(profile.avatar, 200), (profile.avatar_small, 100)]:
+            with Image.open(field.path) as image:
+                self.assertEqual(image.size, (size, size))
+                self.assertEqual(dict(image.getexif()), {})
+        self.assertEqual(profile.avatar_url, profile.avatar.url)
+
+    def test_replacing_and_deleting_clean_up_files(self):
+        self.upload()
+        self.run_jobs()
+        first = UserProfile.objects.get(user=self.user)
+
+        self.upload()
+        self.run_jobs()
+        for field in (first.avatar, first.avatar_small):
+            self.assertFalse(os.path.exists(field.path))
+
+        second = UserProfile.objects.get(user=self.user)
+        self.client.get("/users/delete-photo/")
+        profile = UserProfile.objects.get(user=self.user)
+        self.assertIsNone(profile.avatar_url)
+        self.assertFalse(os.path.exists(second.avatar.path))
+
+
+    def test_upload_during_processing_is_not_overwritten(self):
+        stale = self.upload()
+        # A newer upload lands while the job is still rendering the old photo.
+        UserProfile.objects.filter(user=self.user).update(photo="profile_photos/newer.jpg")
+
+        avatars.process(stale)
+
+        profile = UserProfile.objects.get(user=self.user)
+        self.assertEqual(profile.photo.name, "profile_photos/newer.jpg")
+        self.assertFalse(profile.avatar)
+        rendered = stale.avatar.storage.path("avatars")
+        self.assertEqual(os.listdir(rendered) if os.path.isdir(rendered) else [], [])
+
+
+class MyOrdersTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("ali", "ali@example.com", "secret")
+        self.client.force_login(self.user)
+        self.product = make_product("Lime", price=2)
+        self.order = make_order(self.user, [(self.product, 3)])
+
+    def test_unchanged_page_is_not_rendered_again(self):
+        first = self.client.get("/users/my-orders/")
+        self.assertEqual(first.status_code, 200)
+        self.assertNotIn("Last-Modified", first)
+
+        repeat = self.client.get("/users/my-orders/", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(repeat.status_code, 304)
+
+    def test_validator_changes_with_orders_and_cart(self):
+        etag = self.client.get("/users/my-orders/")["ETag"]
+
+        Order.objects.filter(id=self.order.id).update(status=OrderStatus.COLLECTING, updated_at=timezone.now())
+        response = self.client.get("/users/my-orders/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        etag = response["ETag"]
+        CartItem.objects.create(cart=Cart.objects.get_or_create(user=self.user)[0], product=self.product)
+        response = self.client.get("/users/my-orders/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_if_modified_since_alone_does_not_short_circuit(self):
+        later = timezone.now() + timedelta(days=1)
+        response = self.client.get("/users/my-orders/", HTTP_IF_MODIFIED_SINCE=http_date(later.timestamp()))
+        self.assertEqual(response.status_code, 200)
+
+    def test_search_filters_by_product_name_and_keeps_full_totals(self):
+        melon = make_product("Melon", price=5)
+        mixed = make_order(self.user, [(melon, 1), (self.product, 2)])
+        make_order(User.objects.create_user("other", "other@example.com", "secret"), [(melon, 9)])
+
+        response = self.client.get("/users/my-orders/", {"q": "melo"})
+
+        orders = response.context["orders"].object_list
+        self.assertEqual([order.id for order in orders], [mixed.id])
+        self.assertEqual(orders[0].total, 9)
+        self.assertEqual(orders[0].quantity, 3)
+        self.assertEqual(response.context["query"], "melo")
+        self.assertEqual(self.client.get("/users/my-orders/", {"q": "durian"}).context["orders"].object_list, [])
 
-# Create your tests here.
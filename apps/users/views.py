@@ -1,9 +1,12 @@
-import requests
+import logging
 from django.shortcuts import render, redirect
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required
-from .models import User, Code, UserProfile, UserAddress
+from apps.common.ratelimit import ratelimit
+from . import avatars, codes, google
+from .models import User, UserAddress
 from .service import send_registration_code_async, send_change_email_code_async
+from .tasks import process_avatar
 from django.contrib import messages
 from .forms import UserForm, UserProfileForm, CountryForm
 from django.contrib.auth.hashers import check_password
@@ -11,8 +14,22 @@ from core.settings import base
 from django.http import HttpResponse
 from django.http import Http404
 from django.core.exceptions import ObjectDoesNotExist
-from apps.orders.models import Order, OrderAddress, OrderItem, OrderStatus
+from apps.orders.models import Order, OrderAddress, OrderItem, OrderStatus, ArchivedOrder
 from django.conf import settings
+from django.core.paginator import Paginator
+from django.db.models import Count, F, Max, Prefetch, Sum, prefetch_related_objects
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+from apps.cart.models import CartItem
+from apps.products.models import Product
+import hashlib
+import os
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# login() needs the backend spelled out when more than one is configured.
+ACCOUNT_BACKEND = 'apps.users.backends.AccountBackend'
 
 def register_view(request):
     if request.method == 'POST':
@@ -38,13 +55,14 @@ def register_view(request):
             email=email,
             password=password
         )
-        login(request, user)
+        login(request, user, backend=ACCOUNT_BACKEND)
         messages.success(request, "Registration successful")
         return redirect('users:home')
 
     return render(request, 'users/register.html')
 
 
+@ratelimit('login', limit=10, period=60, account=lambda request: request.POST.get('username'))
 def login_view(request):
     if request.method == 'POST':
         username = request.POST.get('username')
@@ -86,6 +104,7 @@ def settings_view(request):
     return render(request, 'settings.html', {'user': user})
 
 @login_required
+@ratelimit('change-email', limit=3, period=300, account=lambda request: request.user.pk)
 def change_email(request):
     user = request.user
     if request.method == 'POST':
@@ -99,26 +118,23 @@ def change_email(request):
     return render(request, 'settings/change-email.html', {'user': user})
 
 @login_required
+@ratelimit('verify-change-email', limit=10, period=300, account=lambda request, email: request.user.pk)
 def verify_change_email(request, email):
     user = request.user
 
     if request.method == 'POST':
         code_value = request.POST.get('code')
 
-        code = Code.objects.filter(code=code_value, user=user).first()
+        result = codes.consume(user, codes.CHANGE_EMAIL, code_value, email)
 
-        if not code:
+        if result == codes.INVALID:
             messages.error(request, "Invalid code")
             return redirect('users:change_email')
 
-        if code.is_expired():
+        if result == codes.EXPIRED:
             messages.error(request, "Code has expired")
             return redirect('users:change_email')
 
-        if code.user != user:
-            messages.error(request, "Invalid code")
-            return redirect('users:change_email')
-
         user = request.user
         user.email = email
         user.save()
@@ -206,22 +222,28 @@ def edit_profile(request):
 
 @login_required
 def upload_photo(request):
-    user = request.user
-    user_profile = UserProfile.objects.filter(user = user).first()
+    user_profile = request.account.profile
     if request.method == "POST" and request.FILES.get("image"):
-        user_profile.photo = request.FILES["image"]
-        user_profile.save()
+        # An earlier upload that was never processed; the current avatar stays until the new one is ready.
+        avatars.delete_files(user_profile, ['photo'])
+        upload = request.FILES["image"]
+        # A name that is never reused, so the job can tell its photo from a newer upload.
+        upload.name = f'{user_profile.pk}-{uuid.uuid4().hex[:12]}{os.path.splitext(upload.name)[1]}'
+        user_profile.photo = upload
+        user_profile.save(update_fields=['photo'])
+        process_avatar.enqueue(profile_id=user_profile.id, photo=user_profile.photo.name)
         return redirect('users:upload_photo')
     return render(request, 'settings/upload-photo.html', {'user_profile': user_profile ,'user_profile_photo': user_profile.photo})
 
 @login_required
 def delete_photo(request):
-    user = request.user
-    user_profile = UserProfile.objects.filter(user = user).first()
-    user_profile.photo.delete()
+    user_profile = request.account.profile
+    avatars.delete_files(user_profile)
+    user_profile.save(update_fields=avatars.IMAGE_FIELDS)
     return redirect('users:upload_photo')
 
 
+@ratelimit('forgot', limit=3, period=300, account=lambda request: request.POST.get('email'))
 def forgot_view(request):
     if request.method == 'POST':
         email = request.POST.get('email')
@@ -238,6 +260,7 @@ def forgot_view(request):
     return render(request, 'users/forgot.html')
 
 
+@ratelimit('restore', limit=10, period=300, account=lambda request, email: email)
 def restore_view(request, email):
     if request.method == 'POST':
         code_value = request.POST.get('code')
@@ -253,13 +276,13 @@ def restore_view(request, email):
             messages.error(request, "User not found")
             return redirect('users:forgot')
 
-        code = Code.objects.filter(code=code_value, user=user).first()
+        result = codes.consume(user, codes.RESTORE, code_value)
 
-        if not code:
+        if result == codes.INVALID:
             messages.error(request, "Invalid code")
             return redirect('users:restore', email)
 
-        if code.is_expired():
+        if result == codes.EXPIRED:
             messages.error(request, "Code has expired")
             return redirect('users:forgot')
 
@@ -296,22 +319,16 @@ def google_loging(request):
 def google_callback(request):
     code = request.GET.get('code')
 
-    token_data = {
-        "code": code,
-        "client_id": base.GOOGLE_CLIENT_ID,
-        "client_secret": base.GOOGLE_CLIENT_SECRET,
-        "redirect_uri": base.GOOGLE_REDIRECT_URI,
-        "grant_type": "authorization_code",
-    }
-    token_response = requests.post(base.GOOGLE_TOKEN_URL, data=token_data)
-    token_json = token_response.json()
-    access_token = token_json.get("access_token")
-
-    user_info_response = requests.get(
-        base.GOOGLE_USER_INFO_URL,
-        headers={"Authorization": f"Bearer {access_token}"}
-    )
-    user_info = user_info_response.json()
+    try:
+        token_json = google.exchange_code(code)
+        user_info = google.user_info(token_json)
+    except google.GoogleError:
+        logger.exception("Google sign-in failed")
+        return HttpResponse("Could not reach Google, please try again.", status=502)
+
+    if not user_info.get('email_verified'):
+        # An unverified address proves nothing; it must not log in or link to the account that owns it.
+        return HttpResponse("Your Google email address is not verified.", status=403)
 
     email = user_info.get('email')
     google_id = user_info.get('id')
@@ -336,7 +353,7 @@ def google_callback(request):
             )
             # UserProfile.objects.create(user=user)
 
-    login(request, user)
+    login(request, user, backend=ACCOUNT_BACKEND)
     return redirect('users:home')
 
 
@@ -345,10 +362,7 @@ def google_callback(request):
 @login_required
 def address(request):
     user = request.user
-    try:
-        address = UserAddress.objects.get(user=user)
-    except UserAddress.DoesNotExist:
-        address = None
+    address = request.account.address
 
     if request.method == 'POST':
         address_value = request.POST.get('address')
@@ -377,11 +391,66 @@ def address(request):
 
 
 
+MY_ORDERS_PAGE_SIZE = 10
+
+
+def _my_orders_state(request):
+    """Latest change and counts behind the user's orders page, computed once per request."""
+    if not hasattr(request, '_my_orders_state'):
+        state = Order.objects.filter(user=request.user).aggregate(
+            latest=Max('updated_at'),
+            count=Count('id'),
+        )
+        # The page header shows the cart size, so it is part of what the browser caches.
+        state['cart_items'] = CartItem.objects.filter(cart__user=request.user).count()
+        request._my_orders_state = state
+    return request._my_orders_state
+
+
+def _my_orders_etag(request):
+    state = _my_orders_state(request)
+    latest = state['latest'].timestamp() if state['latest'] else 0
+    raw = f"{request.user.pk}:{latest}:{state['count']}:{state['cart_items']}:{request.GET.urlencode()}"
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+# No Last-Modified: the page also depends on the cart and the query string, which
+# a date cannot express, so If-Modified-Since alone could validate a stale copy.
 @login_required
+@condition(etag_func=_my_orders_etag)
 def my_orders(request):
     user = request.user
-    orders = Order.objects.filter(user=user).prefetch_related(
-        'orderitem__product',   
-        'orderaddress'
+    if request.GET.get('archived') == '1':
+        orders = ArchivedOrder.objects.filter(user=user).order_by('-created_at')
+        orders = Paginator(orders, 20).get_page(request.GET.get('page'))
+        response = render(request, 'users/my_orders.html', {'orders': orders, 'archived': True})
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    orders = (
+        Order.objects.filter(user=user)
+        .select_related('orderaddress')
+        .annotate(
+            total=Sum(F('orderitem__quantity') * F('orderitem__price')),
+            quantity=Sum('orderitem__quantity'),
+        )
+        .order_by('-created_at')
+    )
+    query = request.GET.get('q', '').strip()
+    if query:
+        # Resolve the (small) product table first, then walk the (product, order) index
+        # instead of scanning every item the user ever ordered.
+        matching_orders = OrderItem.objects.filter(
+            order__user=user,
+            product_id__in=Product.objects.filter(name__icontains=query).values('id'),
+        ).values('order_id')
+        orders = orders.filter(id__in=matching_orders)
+    orders = Paginator(orders, MY_ORDERS_PAGE_SIZE).get_page(request.GET.get('page'))
+    orders.object_list = list(orders.object_list)
+    prefetch_related_objects(
+        orders.object_list,
+        Prefetch('orderitem', queryset=OrderItem.objects.select_related('product').order_by('id')),
     )
-    return render(request, 'users/my_orders.html', {'orders': orders})
\ No newline at end of file
+    response = render(request, 'users/my_orders.html', {'orders': orders, 'query': query})
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
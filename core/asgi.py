@@ -3,14 +3,23 @@ ASGI config for core project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+This is the production entry point (``gunicorn core.asgi:application -k
+uvicorn.workers.UvicornWorker``) so long-lived streams such as the order
+status events at ``orders/events/`` hold a coroutine instead of a worker
+thread. Like manage.py it reads ``.env``; without DJANGO_SETTINGS_MODULE it
+uses the production settings.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
 """
 
 import os
+from pathlib import Path
 
+import environ
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+environ.Env().read_env(os.path.join(Path(__file__).resolve().parent.parent, ".env"))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings.production')
 
 application = get_asgi_application()
@@ -54,6 +54,7 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "apps.users.middleware.account_middleware",
     # 'social_core.backends.google.GoogleOAuth2',
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
@@ -78,6 +79,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'core.wsgi.application'
+ASGI_APPLICATION = 'core.asgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
@@ -89,6 +91,19 @@ DATABASES = {
     }
 }
 
+# Cache
+# Local memory for development only. production.py requires CACHE_URL to point
+# at a cache every worker shares (e.g. CACHE_URL=rediscache://127.0.0.1:6379/1).
+CACHES = {
+    "default": env.cache("CACHE_URL", default="locmemcache://"),
+}
+
+# Sessions are read from the cache and only fall back to the database on a
+# miss; writes go to both. With the per-process local memory cache a worker
+# could serve a stale session, hence the shared cache in production.
+SESSION_ENGINE = "django.contrib.sessions.backends.cached_db"
+SESSION_CACHE_ALIAS = "default"
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 
@@ -144,17 +159,61 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 AUTH_USER_MODEL = "users.User"
+AUTHENTICATION_BACKENDS = [
+    "apps.users.backends.AccountBackend",
+    # Keeps sessions that were created before AccountBackend valid.
+    "django.contrib.auth.backends.ModelBackend",
+]
 
 LOGIN_URL = 'users/login/'
 
+# Accepted/canceled orders untouched for this many days are moved to ArchivedOrder
+ORDER_ARCHIVE_AFTER_DAYS = env.int("ORDER_ARCHIVE_AFTER_DAYS", default=180)
+
+# How long stock reserved at checkout is held before release_reservations returns it
+STOCK_RESERVATION_MINUTES = env.int("STOCK_RESERVATION_MINUTES", default=15)
+
+# Delivery quotes: fee = base + per_km * distance from the nearest depot,
+# ETA = preparation time + travel time at the average courier speed
+DELIVERY_DEPOTS = env.json("DELIVERY_DEPOTS", default=[
+    {"name": "Central London", "latitude": 51.5074, "longitude": -0.1278},
+])
+DELIVERY_BASE_FEE = env.float("DELIVERY_BASE_FEE", default=2.0)
+DELIVERY_FEE_PER_KM = env.float("DELIVERY_FEE_PER_KM", default=0.5)
+DELIVERY_PREP_MINUTES = env.int("DELIVERY_PREP_MINUTES", default=20)
+DELIVERY_SPEED_KMH = env.float("DELIVERY_SPEED_KMH", default=20.0)
+DELIVERY_QUOTE_CACHE_SECONDS = env.int("DELIVERY_QUOTE_CACHE_SECONDS", default=60 * 60)
+
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
-EMAIL_HOST = 'smtp.gmail.com'
-EMAIL_PORT = 587
-EMAIL_USE_TLS = True
+EMAIL_HOST = env.str("EMAIL_HOST", default='smtp.gmail.com')
+EMAIL_PORT = env.int("EMAIL_PORT", default=587)
+EMAIL_USE_TLS = env.bool("EMAIL_USE_TLS", default=True)
+EMAIL_TIMEOUT = env.int("EMAIL_TIMEOUT", default=10)
 EMAIL_HOST_USER = env.str("EMAIL_HOST_USER")
 EMAIL_HOST_PASSWORD = env.str("EMAIL_HOST_PASSWORD")
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 
+# Background email delivery (apps.users.mailer): worker threads per process,
+# bounded queue, retries with exponential backoff, idle SMTP connection lifetime
+EMAIL_WORKERS = env.int("EMAIL_WORKERS", default=2)
+EMAIL_QUEUE_SIZE = env.int("EMAIL_QUEUE_SIZE", default=200)
+EMAIL_MAX_RETRIES = env.int("EMAIL_MAX_RETRIES", default=3)
+EMAIL_RETRY_BACKOFF = env.float("EMAIL_RETRY_BACKOFF", default=1.0)
+EMAIL_IDLE_TIMEOUT = env.int("EMAIL_IDLE_TIMEOUT", default=30)
+# "pool" sends from in-process threads; "queue" stores each email as a Job for `run_worker`.
+EMAIL_DELIVERY = env.str("EMAIL_DELIVERY", default="pool")
+
+# Verification codes live in the cache; the Code table only records them when auditing is on.
+VERIFICATION_CODE_TTL = env.int("VERIFICATION_CODE_TTL", default=35)
+# The TTL starts when the email is sent; until then a code waits up to this long for a busy queue.
+VERIFICATION_CODE_SEND_WINDOW = env.int("VERIFICATION_CODE_SEND_WINDOW", default=15 * 60)
+VERIFICATION_CODE_MAX_ATTEMPTS = env.int("VERIFICATION_CODE_MAX_ATTEMPTS", default=5)
+VERIFICATION_CODE_AUDIT = env.bool("VERIFICATION_CODE_AUDIT", default=False)
+
+RATELIMIT_ENABLED = env.bool("RATELIMIT_ENABLED", default=True)
+# Only enable behind a proxy that appends the client address to X-Forwarded-For.
+RATELIMIT_TRUST_FORWARDED_FOR = env.bool("RATELIMIT_TRUST_FORWARDED_FOR", default=False)
+
 GOOGLE_CLIENT_ID=env.str("CLIENT_ID")
 GOOGLE_CLIENT_SECRET=env.str("GOOGLE_SECRET_KEY")
 
@@ -162,6 +221,10 @@ GOOGLE_REDIRECT_URI="http://localhost:8000/users/google/login/callback/"
 GOOGLE_AUTH_URL="https://accounts.google.com/o/oauth2/auth"
 GOOGLE_USER_INFO_URL="https://www.googleapis.com/oauth2/v1/userinfo"
 GOOGLE_TOKEN_URL="https://oauth2.googleapis.com/token"
+GOOGLE_JWKS_URL="https://www.googleapis.com/oauth2/v3/certs"
+GOOGLE_CONNECT_TIMEOUT = env.float("GOOGLE_CONNECT_TIMEOUT", default=3.05)
+GOOGLE_READ_TIMEOUT = env.float("GOOGLE_READ_TIMEOUT", default=10)
+GOOGLE_HTTP_RETRIES = env.int("GOOGLE_HTTP_RETRIES", default=2)
 
 
 
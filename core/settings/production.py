@@ -6,6 +6,16 @@ from .base import *  # noqa
 
 DEBUG = False
 
+###################################################################
+# Cache
+###################################################################
+
+# Sessions, verification codes and the delivery zone version live here, so
+# every worker and process must see the same cache: no local-memory default.
+CACHES = {
+    "default": env.cache("CACHE_URL"),
+}
+
 ###################################################################
 # Django security
 ###################################################################
@@ -1,6 +1,10 @@
 import os
+from pathlib import Path
+
+import environ
 from django.core.wsgi import get_wsgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+environ.Env().read_env(os.path.join(Path(__file__).resolve().parent.parent, ".env"))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings.production')
 
 application = get_wsgi_application()